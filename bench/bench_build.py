@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build.py 各阶段基准测试
+
+在临时目录中生成合成课程与音频树（N 个等级 × M 个单元 × K 个汉字），
+不依赖 Node/Gradle，逐个运行 build.py 的 Python 阶段，记录耗时与峰值内存，
+并与保存的基线比较。
+
+用法：
+  python bench/bench_build.py                          # 默认规模，与基线比较（基线缺失时退出码 2）
+  python bench/bench_build.py --levels 4,7 --units 60  # 观察等级数增长时的耗时变化
+  python bench/bench_build.py --save-baseline          # 把本次结果写为基线
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import build  # noqa: E402
+from build import log_info, log_success, log_warning, log_error, log_step  # noqa: E402
+
+BASELINE_PATH = REPO_ROOT / "bench" / "baseline.json"
+CLIPS_PER_CHAR = ["char.mp3", "sentence.mp3", "word_1.mp3", "word_2.mp3", "word_3.mp3", "word_4.mp3"]
+# 实际内置音频平均约 40 KB/个（80,190,563 bytes / 1968 个）
+CLIP_SIZE_RANGE = (20 * 1024, 60 * 1024)
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, 无填充：每帧 417 字节
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x00]) + bytes(417 - 4)
+MIPMAP_DIRS = ["mipmap-mdpi", "mipmap-hdpi", "mipmap-xhdpi", "mipmap-xxhdpi", "mipmap-xxxhdpi"]
+# 耗时低于该值时只看相对变化会被噪声主导
+MIN_REGRESSION_SECONDS = 0.01
+
+
+def chinese_number(n):
+    """把 1~9999 转为中文数字，与 getUnitCode() 的解析规则对应"""
+    digits = "零一二三四五六七八九"
+    units = [(1000, "千"), (100, "百"), (10, "十")]
+    if n < 10:
+        return digits[n]
+    text = ""
+    zero_pending = False
+    for value, name in units:
+        q, n = divmod(n, value)
+        if q:
+            if zero_pending:
+                text += "零"
+                zero_pending = False
+            text += ("" if (value == 10 and q == 1 and not text) else digits[q]) + name
+        elif text:
+            zero_pending = True
+    if n:
+        if zero_pending:
+            text += "零"
+        text += digits[n]
+    return text
+
+
+def write_text(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+
+def generate_tree(root, levels, units, chars, seed=0):
+    """生成合成项目目录，返回音频文件数与总字节数"""
+    rng = random.Random(seed)
+    root = Path(root)
+
+    write_text(root / "index.html", "<html><head><style>:root { --nav-bg: #f5f0e6; }</style></head><body></body></html>\n")
+    for name in ("main.js", "app.js", "ui.js", "audio-manager.js"):
+        write_text(root / "js" / name, "// synthetic\n" * 200)
+    write_text(root / "js" / "config.js", "const SUPABASE_CONFIG = {\n  url: 'http://127.0.0.1',\n  key: '',\n  bucket: 'shizi-audio'\n};\n")
+    shutil.copy2(str(REPO_ROOT / "icon.png"), str(root / "icon.png"))
+
+    code_point = 0x4E00
+    hanzi_table = []
+    audio_files = 0
+    audio_bytes = 0
+    for level in range(levels):
+        level_name = f"L{level}"
+        lines = []
+        for unit in range(1, units + 1):
+            lines.append(f"第{chinese_number(unit)}单元:")
+            for _ in range(chars):
+                char = chr(code_point)
+                code_point += 1
+                hanzi_table.append(f"'{hex(ord(char))}': {char}")
+                words = ", ".join(char + chr(0x4E00 + rng.randrange(3000)) for _ in range(4))
+                lines.append(f"  {char}:")
+                lines.append(f"    词: [{words}]")
+                lines.append(f"    句: 这是{char}的例句。")
+
+                clip_dir = root / build.BUILTIN_AUDIO_SRC_DIR / level_name / f"Unit_{unit}" / f"c{ord(char):x}"
+                clip_dir.mkdir(parents=True, exist_ok=True)
+                for clip in CLIPS_PER_CHAR:
+                    frames = rng.randint(*CLIP_SIZE_RANGE) // len(MP3_FRAME)
+                    data = MP3_FRAME * frames
+                    (clip_dir / clip).write_bytes(data)
+                    audio_files += 1
+                    audio_bytes += len(data)
+            lines.append("")
+        write_text(root / "yaml" / f"contents_{level_name}.yaml", "\n".join(lines))
+    write_text(root / "yaml" / "hanzi_3500.yaml", "\n".join(hanzi_table) + "\n")
+
+    generate_android_project(root / build.ANDROID_DIR)
+    return audio_files, audio_bytes
+
+
+def generate_android_project(android_dir):
+    """生成 apply_android_app_metadata() 需要触达的 Android 工程骨架"""
+    main_dir = android_dir / "app" / "src" / "main"
+    write_text(main_dir / "res" / "values" / "strings.xml", """<?xml version='1.0' encoding='utf-8'?>
+<resources>
+    <string name="app_name">shizi</string>
+    <string name="title_activity_main">shizi</string>
+    <string name="package_name">com.example.app</string>
+    <string name="custom_url_scheme">com.example.app</string>
+</resources>
+""")
+    write_text(main_dir / "res" / "values" / "styles.xml", "<resources></resources>\n")
+    write_text(android_dir / "app" / "build.gradle", """android {
+    namespace "com.example.app"
+    compileSdk 33
+    defaultConfig {
+        applicationId "com.example.app"
+        versionName "1.0"
+    }
+}
+""" + "// padding\n" * 200)
+    write_text(main_dir / "java" / "com" / "example" / "app" / "MainActivity.java", "package com.example.app;\n")
+    write_text(main_dir / "AndroidManifest.xml", """<?xml version="1.0" encoding="utf-8"?>
+<manifest xmlns:android="http://schemas.android.com/apk/res/android">
+    <application android:label="@string/app_name"></application>
+</manifest>
+""")
+    for name in MIPMAP_DIRS:
+        for icon in ("ic_launcher.png", "ic_launcher_round.png"):
+            target = main_dir / "res" / name / icon
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(b"\x89PNG placeholder")
+
+
+def stage_lint():
+    # 进程内解析：进程池启动耗时波动大，且 tracemalloc 看不到子进程内存
+    shutil.rmtree(build.BUILD_CACHE_DIR, ignore_errors=True)
+    return build.lint(workers=1)
+
+
+def stage_lint_cached():
+    return build.lint()
+
+
+def stage_copy_web_assets():
+    return build.copy_web_assets()
+
+
+def stage_build_audio_manifest():
+    return build.build_audio_manifest(
+        build.BUILTIN_AUDIO_WWW_DIR, build.BUILTIN_AUDIO_MANIFEST, build.BUILTIN_AUDIO_MANIFEST_SHARDS_DIR
+    )
+
+
+def stage_update_file_by_regex():
+    gradle_path = os.path.join(build.ANDROID_DIR, "app", "build.gradle")
+    for version in ("1.0", "2.0"):
+        build.update_file_by_regex(gradle_path, [(r'versionName\s+"[^"]+"', f'versionName "{version}"')])
+    return True
+
+
+def stage_apply_android_app_metadata():
+    config = build.read_args_yaml()
+    build.apply_android_app_metadata(config)
+    return True
+
+
+# 阶段顺序有依赖：manifest 基于 copy_web_assets 复制出的 www/audio
+STAGES = [
+    ("lint", stage_lint),
+    ("lint_cached", stage_lint_cached),
+    ("copy_web_assets", stage_copy_web_assets),
+    ("build_audio_manifest", stage_build_audio_manifest),
+    ("update_file_by_regex", stage_update_file_by_regex),
+    ("apply_android_app_metadata", stage_apply_android_app_metadata),
+]
+
+
+def measure(func, repeat):
+    """返回 (最短耗时秒数, 峰值内存字节)；峰值内存单独测一次，避免 tracemalloc 拖慢计时"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+def run_scenario(levels, units, chars, repeat):
+    """在临时目录中生成一套规模的合成项目并测量各阶段"""
+    scenario = f"L{levels}xU{units}xC{chars}"
+    log_step(f"基准场景 {scenario}")
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="shizi-bench-")
+    try:
+        os.chdir(work_dir)
+        start = time.perf_counter()
+        audio_files, audio_bytes = generate_tree(work_dir, levels, units, chars)
+        log_info(f"生成合成树: {audio_files} 个音频，{audio_bytes / 1024 / 1024:.1f} MB，"
+                 f"耗时 {time.perf_counter() - start:.2f}s")
+
+        results = {}
+        for name, func in STAGES:
+            seconds, peak = measure(func, repeat)
+            results[name] = {"seconds": round(seconds, 6), "peak_bytes": peak}
+            log_info(f"{name:<32} {seconds * 1000:10.1f} ms {peak / 1024 / 1024:10.2f} MB")
+        return scenario, {"audio_files": audio_files, "audio_bytes": audio_bytes, "stages": results}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """返回回归项列表：耗时或峰值内存超过基线 (1 + threshold) 倍"""
+    regressions = []
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            log_warning(f"基线中没有场景 {scenario}，跳过比较")
+            continue
+        for stage, metrics in current["stages"].items():
+            base_metrics = base["stages"].get(stage)
+            if not base_metrics:
+                continue
+            base_seconds = base_metrics["seconds"]
+            if (metrics["seconds"] > base_seconds * (1 + threshold)
+                    and metrics["seconds"] - base_seconds > MIN_REGRESSION_SECONDS):
+                regressions.append(f"{scenario} {stage}: 耗时 {base_seconds * 1000:.1f} -> {metrics['seconds'] * 1000:.1f} ms")
+            base_peak = base_metrics["peak_bytes"]
+            if base_peak and metrics["peak_bytes"] > base_peak * (1 + threshold):
+                regressions.append(f"{scenario} {stage}: 峰值内存 {base_peak} -> {metrics['peak_bytes']} bytes")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='build.py 各阶段基准测试')
+    parser.add_argument('--levels', default='4', help='等级数，可用逗号给出多个规模，如 4,7')
+    parser.add_argument('--units', type=int, default=20, help='每个等级的单元数')
+    parser.add_argument('--chars', type=int, default=5, help='每个单元的汉字数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数（取最短耗时）')
+    parser.add_argument('--threshold', type=float, default=0.25, help='回归阈值（相对基线的增幅）')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写为基线')
+    args = parser.parse_args()
+
+    results = {}
+    for levels in [int(x) for x in args.levels.split(",") if x.strip()]:
+        scenario, result = run_scenario(levels, args.units, args.chars, max(1, args.repeat))
+        results[scenario] = result
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline = {}
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        baseline.update(results)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        log_success(f"已写入基线: {baseline_path}")
+        return
+
+    # 基线与机器相关，不随仓库提交；缺失时无法做回归检查，以退出码 2 失败而不是静默通过
+    if not baseline_path.exists():
+        log_error(f"基线不存在: {baseline_path}，请先在本机使用 --save-baseline 生成")
+        sys.exit(2)
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    if regressions:
+        for item in regressions:
+            log_error(item)
+        log_error(f"发现 {len(regressions)} 项性能回归（阈值 {args.threshold:.0%}）")
+        sys.exit(1)
+    log_success(f"未发现超过 {args.threshold:.0%} 的性能回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,20 +8,26 @@ Android APK 构建脚本
   build.py sync      - 同步 Web 代码到 Android 项目
   build.py build     - 构建 APK 并复制到项目根目录
   build.py clean     - 清理构建文件
+  build.py pull-audio - 从 Supabase 存储桶镜像内置音频到 shizi-audio-cache
+  build.py process-audio - 响度归一化、去首尾静音并重新编码内置音频
+  build.py lint      - 校验 yaml 课程数据
+  build.py render-android [--dry-run] - 仅渲染 Android 工程元数据（dry-run 只输出差异）
+  build.py snapshot-records [--from-export FILE] - 生成 audio_records 表快照，随应用打包
+
+任意命令可加 --profile，用 cProfile/tracemalloc 分析耗时与内存，结果写入 .build_cache/profile/
 """
 
 import os
 import sys
-import subprocess
 import argparse
 import shutil
 import json
-import yaml
 import re
-import hashlib
-from xml.sax.saxutils import escape as xml_escape
 from pathlib import Path
 
+# yaml / subprocess / hashlib / http.client / concurrent.futures 等较重的模块在用到的函数内导入，
+# 使 clean、无变化的 sync 等命令启动时不必加载它们
+
 # 全局变量
 ANDROID_BUILD_DIR = "android_build"
 ANDROID_DIR = os.path.join(ANDROID_BUILD_DIR, "android")
@@ -29,6 +35,47 @@ GRADLE_WRAPPER = os.path.join(ANDROID_DIR, "gradlew.bat")
 BUILTIN_AUDIO_SRC_DIR = "shizi-audio-cache"
 BUILTIN_AUDIO_WWW_DIR = os.path.join(ANDROID_BUILD_DIR, "www", "audio")
 BUILTIN_AUDIO_MANIFEST = os.path.join(ANDROID_BUILD_DIR, "www", "audio-manifest.json")
+BUILTIN_AUDIO_MANIFEST_SHARDS_DIR = os.path.join(ANDROID_BUILD_DIR, "www", "audio-manifest")
+BUILTIN_AUDIO_PLAYLISTS_DIR = os.path.join(ANDROID_BUILD_DIR, "www", "playlists")
+# audio_records 表快照：snapshot-records 生成，sync 时随应用打包
+UNIT_FRAGMENTS_DIR = os.path.join(ANDROID_BUILD_DIR, "www", "units")
+AUDIO_RECORDS_SNAPSHOT = "audio-records.json"
+AUDIO_RECORDS_WWW = os.path.join(ANDROID_BUILD_DIR, "www", "audio-records.json")
+AUDIO_RECORDS_COLUMNS = ["path", "level", "unit", "char", "type", "created_at"]
+SUPABASE_CONFIG_JS = os.path.join("js", "config.js")
+BUILD_CACHE_DIR = ".build_cache"
+AUDIO_PULL_MANIFEST = os.path.join(BUILD_CACHE_DIR, "audio-pull-manifest.json")
+ARGS_CACHE = os.path.join(BUILD_CACHE_DIR, "args-cache.json")
+PROFILE_DIR = os.path.join(BUILD_CACHE_DIR, "profile")
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_TOP_N = 40
+AUDIO_PULL_WORKERS = 8
+AUDIO_PULL_PAGE_SIZE = 1000
+IO_CHUNK_SIZE = 64 * 1024
+AUDIO_PROCESSED_DIR = os.path.join(BUILD_CACHE_DIR, "audio-processed")
+AUDIO_ENCODED_CACHE_DIR = os.path.join(BUILD_CACHE_DIR, "audio-encoded")
+# 文件 sha256 索引（按绝对路径，(size, mtime) 未变时复用），音频处理与产物缓存共用
+FILE_DIGEST_INDEX = os.path.join(BUILD_CACHE_DIR, "file-digests.json")
+AUDIO_PROCESSING_DEFAULTS = {
+    "enabled": False,
+    "encoder": "ffmpeg",
+    "codec": "libmp3lame",
+    "bitrate": "64k",
+    "sample_rate": 44100,
+    "channels": 1,
+    "loudness": -16,
+    "silence_db": -50,
+    "workers": 0,
+}
+# 内置音频路径（*.mp3）与播放清单的帧解析都要求 MP3 码流，内置 ffmpeg 编码链只接受这些编码器
+AUDIO_MP3_CODECS = ("libmp3lame", "libshine", "mp3")
+# 共享产物缓存（CI 构建机共用）：dir 为空且未设置环境变量时禁用
+ARTIFACT_CACHE_ENV = "SHIZI_ARTIFACT_CACHE"
+ARTIFACT_CACHE_DEFAULTS = {
+    "backend": "dir",
+    "dir": "",
+    "max_size_mb": 4096,
+}
 
 # 颜色输出
 class Colors:
@@ -75,6 +122,7 @@ def log_step(step):
 # 执行命令函数
 def run_command(cmd, cwd=None, capture_output=False):
     """执行命令并返回结果"""
+    import subprocess
     try:
         log_info(f"执行命令: {' '.join(cmd)}")
         if capture_output:
@@ -87,6 +135,196 @@ def run_command(cmd, cwd=None, capture_output=False):
         log_error(f"执行命令失败: {e}")
         return -1, None, str(e)
 
+# 异步阶段编排
+# 外部命令的超时（秒）；超时后结束整个进程树
+STAGE_TIMEOUTS = {
+    "npm_install": 900,
+    "cap_init": 300,
+    "cap_add": 600,
+    "cap_sync": 600,
+    "gradle_warmup": 600,
+    "gradle_assemble": 1800,
+}
+# 子进程单行输出的上限（gradle 偶尔会输出很长的行）
+COMMAND_LINE_LIMIT = 1024 * 1024
+
+
+class BuildStage:
+    """构建图中的一个阶段
+
+    func 为普通函数，在线程池中执行，返回 False 或抛出异常视为失败；
+    cmd 为命令列表，作为异步子进程执行，输出逐行加时间戳转发。
+    deps 中任一必需阶段失败时本阶段取消；after 只约定先后（仅在本阶段真正执行时等待，失败不影响）；
+    enabled 为可选的判断函数，在依赖完成后调用，返回 False 时跳过并视为成功；
+    optional 阶段失败不算整体失败，必需阶段全部结束后仍在运行的 optional 阶段会被取消。
+    """
+
+    def __init__(self, name, func=None, cmd=None, cwd=None, deps=(), after=(), timeout=None, optional=False, enabled=None):
+        self.name = name
+        self.func = func
+        self.cmd = cmd
+        self.cwd = cwd
+        self.deps = tuple(deps)
+        self.after = tuple(after)
+        self.timeout = timeout
+        self.optional = optional
+        self.enabled = enabled
+
+
+def format_timestamp():
+    """当前时间，精确到毫秒"""
+    import time
+    now = time.time()
+    return time.strftime("%H:%M:%S", time.localtime(now)) + f".{int(now % 1 * 1000):03d}"
+
+
+def terminate_process_tree(proc):
+    """结束子进程及其子孙进程（shell 启动的工具是 shell 的子进程）"""
+    import subprocess
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/T", "/F", "/PID", str(proc.pid)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        else:
+            import signal
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+async def run_command_async(cmd, cwd=None, timeout=None, label=None):
+    """异步执行命令，逐行转发带时间戳的输出，返回退出码；超时返回 -1，超时或被取消时结束整个进程树"""
+    import asyncio
+    import locale
+    import shlex
+    import subprocess
+    label = label or os.path.basename(cmd[0])
+    log_info(f"执行命令: {' '.join(cmd)}")
+    if os.name == "nt":
+        cmdline = subprocess.list2cmdline(cmd)
+        kwargs = {}
+    else:
+        cmdline = " ".join(shlex.quote(part) for part in cmd)
+        # 独立进程组，便于超时时整组结束
+        kwargs = {"start_new_session": True}
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            cmdline,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            limit=COMMAND_LINE_LIMIT,
+            **kwargs
+        )
+    except OSError as e:
+        log_error(f"执行命令失败: {e}")
+        return -1
+    encoding = locale.getpreferredencoding(False)
+
+    async def forward_output():
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            print(f"{format_timestamp()} [{label}] {line.decode(encoding, errors='replace').rstrip()}", flush=True)
+        return await proc.wait()
+
+    try:
+        return await asyncio.wait_for(forward_output(), timeout)
+    except asyncio.TimeoutError:
+        log_error(f"[{label}] 超过 {timeout}s 未完成，已终止")
+        terminate_process_tree(proc)
+        await proc.wait()
+        return -1
+    except asyncio.CancelledError:
+        terminate_process_tree(proc)
+        raise
+
+
+async def run_stage_graph(stages):
+    """按依赖图并发执行阶段；返回必需阶段是否全部成功"""
+    import asyncio
+    import time
+    loop = asyncio.get_running_loop()
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps + stage.after:
+            if dep not in by_name:
+                raise ValueError(f"阶段 {stage.name} 依赖未知阶段: {dep}")
+
+    started_at = time.perf_counter()
+    timings = {}
+    tasks = {}
+
+    async def run_stage(stage):
+        dep_results = await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        failed = [dep for dep, ok in zip(stage.deps, dep_results) if not ok and not by_name[dep].optional]
+        if failed:
+            log_warning(f"[{stage.name}] 已取消: 依赖阶段失败 ({', '.join(failed)})")
+            return False
+        if stage.enabled is not None and not stage.enabled():
+            log_info(f"[{stage.name}] 无需执行，跳过")
+            return True
+        if stage.after:
+            await asyncio.wait([tasks[name] for name in stage.after])
+
+        begin = time.perf_counter()
+        log_info(f"[{stage.name}] 开始 (+{begin - started_at:.1f}s)")
+        try:
+            if stage.cmd is not None:
+                ok = await run_command_async(stage.cmd, cwd=stage.cwd, timeout=stage.timeout, label=stage.name) == 0
+            else:
+                ok = await asyncio.wait_for(loop.run_in_executor(None, stage.func), stage.timeout) is not False
+        except asyncio.TimeoutError:
+            log_error(f"[{stage.name}] 超过 {stage.timeout}s 未完成")
+            ok = False
+        except asyncio.CancelledError:
+            log_warning(f"[{stage.name}] 已取消")
+            raise
+        except Exception as e:
+            log_error(f"[{stage.name}] 出错: {e}")
+            ok = False
+        elapsed = time.perf_counter() - begin
+        timings[stage.name] = (begin - started_at, elapsed)
+        if ok:
+            log_success(f"[{stage.name}] 完成 ({elapsed:.1f}s)")
+        elif stage.optional:
+            log_warning(f"[{stage.name}] 失败，可选阶段不影响构建 ({elapsed:.1f}s)")
+        else:
+            log_error(f"[{stage.name}] 失败 ({elapsed:.1f}s)")
+        return ok
+
+    for stage in stages:
+        tasks[stage.name] = loop.create_task(run_stage(stage))
+
+    required = [stage.name for stage in stages if not stage.optional]
+    results = await asyncio.gather(*(tasks[name] for name in required))
+    # 必需阶段都已结束，仍在运行的可选阶段（如 Gradle 预热）已无意义
+    leftovers = [task for task in tasks.values() if not task.done()]
+    for task in leftovers:
+        task.cancel()
+    if leftovers:
+        await asyncio.wait(leftovers)
+
+    total = time.perf_counter() - started_at
+    log_info(f"阶段耗时（总计 {total:.1f}s）:")
+    for name, (offset, elapsed) in sorted(timings.items(), key=lambda item: item[1][0]):
+        print(f"    {name:<24} +{offset:6.1f}s  {elapsed:6.1f}s")
+    return all(results)
+
+
+def run_stages(stages):
+    """同步入口：执行阶段图，返回是否成功"""
+    import asyncio
+    if os.name == "nt" and sys.version_info < (3, 8):
+        # Python 3.7 在 Windows 上的默认事件循环不支持子进程
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    return asyncio.run(run_stage_graph(stages))
+
 # 环境检查
 def check_environment():
     """检查系统环境"""
@@ -143,17 +381,29 @@ def read_args_yaml():
         "version": "v3.0",
         "icon": "./icon.png",
         "enable_zoom": True,
-        "out_dir": "."
+        "out_dir": ".",
+        "audio_processing": dict(AUDIO_PROCESSING_DEFAULTS),
+        "artifact_cache": dict(ARTIFACT_CACHE_DEFAULTS),
     }
 
     args_yaml_path = "args.yaml"
     if not os.path.exists(args_yaml_path):
         # 创建默认配置
+        import yaml
         with open(args_yaml_path, 'w', encoding='utf-8') as f:
             yaml.dump(default_config, f, allow_unicode=True)
         log_warning(f"创建默认配置文件: {args_yaml_path}")
         return default_config
-    
+
+    # 解析结果按 args.yaml 的 (mtime, size) 缓存，未修改时无需加载 yaml；
+    # build.py 更新后默认值可能变化，一并纳入
+    stat = os.stat(args_yaml_path)
+    stamp = [stat.st_mtime_ns, stat.st_size, os.stat(os.path.abspath(__file__)).st_mtime_ns]
+    cached = load_json_file(ARGS_CACHE)
+    if isinstance(cached, dict) and cached.get("stamp") == stamp:
+        return cached["config"]
+
+    import yaml
     try:
         with open(args_yaml_path, 'r', encoding='utf-8') as f:
             raw_config = yaml.safe_load(f)
@@ -171,6 +421,21 @@ def read_args_yaml():
             config["icon"] = str(config.get("icon") or default_config["icon"]).strip() or default_config["icon"]
             config["out_dir"] = str(config.get("out_dir") or default_config["out_dir"]).strip() or default_config["out_dir"]
             config["enable_zoom"] = bool(config.get("enable_zoom", default_config["enable_zoom"]))
+            audio_processing = dict(AUDIO_PROCESSING_DEFAULTS)
+            if isinstance(config.get("audio_processing"), dict):
+                audio_processing.update(config["audio_processing"])
+            audio_processing["enabled"] = bool(audio_processing["enabled"])
+            if (audio_processing.get("encoder") or "ffmpeg") == "ffmpeg" and audio_processing["codec"] not in AUDIO_MP3_CODECS:
+                log_error(f"audio_processing.codec 不支持: {audio_processing['codec']}（内置音频须为 MP3，"
+                          f"可选 {', '.join(AUDIO_MP3_CODECS)}），改用 {AUDIO_PROCESSING_DEFAULTS['codec']}")
+                audio_processing["codec"] = AUDIO_PROCESSING_DEFAULTS["codec"]
+            config["audio_processing"] = audio_processing
+            artifact_cache = dict(ARTIFACT_CACHE_DEFAULTS)
+            if isinstance(config.get("artifact_cache"), dict):
+                artifact_cache.update(config["artifact_cache"])
+            artifact_cache["dir"] = str(artifact_cache.get("dir") or "").strip()
+            config["artifact_cache"] = artifact_cache
+            write_json_atomic(ARGS_CACHE, {"stamp": stamp, "config": config})
             return config
     except Exception as e:
         log_error(f"读取配置文件失败: {e}")
@@ -183,6 +448,13 @@ def write_file(path, content):
         f.write(content)
 
 
+def apply_regex_replacements(content, replacements):
+    """在内存中按正则批量替换文本"""
+    for pattern, repl in replacements:
+        content = re.sub(pattern, repl, content, flags=re.MULTILINE)
+    return content
+
+
 def update_file_by_regex(path, replacements):
     """按正则批量替换文件内容"""
     if not os.path.exists(path):
@@ -191,16 +463,33 @@ def update_file_by_regex(path, replacements):
     with open(path, 'r', encoding='utf-8') as f:
         content = f.read()
 
-    new_content = content
-    for pattern, repl in replacements:
-        new_content = re.sub(pattern, repl, new_content, flags=re.MULTILINE)
-
+    new_content = apply_regex_replacements(content, replacements)
     changed = new_content != content
     if changed:
         write_file(path, new_content)
     return changed
 
 
+def read_file_bytes(path):
+    """读取文件字节，不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_if_changed(path, content):
+    """内容不同才写入（保持未变化文件的 mtime，避免触发 Gradle 重新编译），返回是否写入"""
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    if read_file_bytes(path) == data:
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+
 def normalize_hex_color(color, fallback="#ffffff"):
     """规范化十六进制颜色值"""
     if not color:
@@ -244,8 +533,8 @@ def detect_navbar_background_color():
     return default_color
 
 
-def write_main_activity_java(path, app_id, enable_zoom):
-    """写入兼容录音权限请求的 MainActivity.java"""
+def render_main_activity_java(app_id, enable_zoom):
+    """生成兼容录音权限请求的 MainActivity.java 内容"""
     zoom_settings = ""
     if enable_zoom:
         zoom_settings = """
@@ -256,7 +545,7 @@ def write_main_activity_java(path, app_id, enable_zoom):
         bridge.getWebView().getSettings().setLoadWithOverviewMode(true);
 """
 
-    content = f"""package {app_id};
+    return f"""package {app_id};
 
 import android.Manifest;
 import android.content.pm.PackageManager;
@@ -347,28 +636,37 @@ public class MainActivity extends BridgeActivity {{
     }}
 }}
 """
-    write_file(path, content)
 
 
-def apply_android_app_metadata(config):
-    """把 args.yaml 的基础信息应用到 Android 构建产物"""
-    app_name = config["name"]
-    app_id = config["pkg"]
-    version_name = config["version"].lstrip('v')
-    icon_path = config.get("icon", "./icon.png")
-    enable_zoom = bool(config.get("enable_zoom", True))
+ANDROID_PERMISSIONS = [
+    "<uses-permission android:name=\"android.permission.INTERNET\" />",
+    "<uses-permission android:name=\"android.permission.READ_EXTERNAL_STORAGE\" />",
+    "<uses-permission android:name=\"android.permission.WRITE_EXTERNAL_STORAGE\" />",
+    "<uses-permission android:name=\"android.permission.RECORD_AUDIO\" />",
+    "<uses-permission android:name=\"android.permission.MODIFY_AUDIO_SETTINGS\" />",
+    "<uses-permission android:name=\"android.permission.MANAGE_EXTERNAL_STORAGE\" />",
+    "<uses-permission android:name=\"android.permission.ACCESS_NETWORK_STATE\" />",
+    "<uses-permission android:name=\"android.permission.ACCESS_WIFI_STATE\" />",
+]
+
+
+def get_status_bar_colors():
+    """返回 (状态栏颜色, Capacitor 使用的 ARGB 颜色)"""
     status_bar_color = detect_navbar_background_color()
     status_bar_color_argb = status_bar_color
     if re.fullmatch(r"#[0-9a-fA-F]{6}", status_bar_color):
         status_bar_color_argb = "#ff" + status_bar_color[1:]
+    return status_bar_color, status_bar_color_argb
+
 
-    # 1) 写入 capacitor.config.ts，包含状态栏配置
-    capacitor_config_path = os.path.join(ANDROID_BUILD_DIR, "capacitor.config.ts")
-    capacitor_config = f"""import {{ CapacitorConfig }} from '@capacitor/cli';
+def render_capacitor_config(config):
+    """生成 capacitor.config.ts 内容，包含状态栏配置"""
+    _, status_bar_color_argb = get_status_bar_colors()
+    return f"""import {{ CapacitorConfig }} from '@capacitor/cli';
 
 const config: CapacitorConfig = {{
-  appId: '{app_id}',
-  appName: '{app_name}',
+  appId: '{config["pkg"]}',
+  appName: '{config["name"]}',
   webDir: 'www',
   server: {{
     androidScheme: 'https'
@@ -383,57 +681,11 @@ const config: CapacitorConfig = {{
 
 export default config;
 """
-    write_file(capacitor_config_path, capacitor_config)
-    log_success("已写入 capacitor.config.ts（含状态栏配置）")
 
-    # 2) 同步 Android 字符串资源中的显示名和包名
-    strings_xml_path = os.path.join(ANDROID_DIR, "app", "src", "main", "res", "values", "strings.xml")
-    if update_file_by_regex(
-        strings_xml_path,
-        [
-            (r"(<string name=\"app_name\">).*?(</string>)", rf"\1{xml_escape(app_name)}\2"),
-            (r"(<string name=\"title_activity_main\">).*?(</string>)", rf"\1{xml_escape(app_name)}\2"),
-            (r"(<string name=\"package_name\">).*?(</string>)", rf"\1{xml_escape(app_id)}\2"),
-            (r"(<string name=\"custom_url_scheme\">).*?(</string>)", rf"\1{xml_escape(app_id)}\2"),
-        ],
-    ):
-        log_success("已同步 strings.xml 的应用名/包名")
 
-    # 3) 同步 Gradle 的 namespace/applicationId/versionName
-    app_build_gradle_path = os.path.join(ANDROID_DIR, "app", "build.gradle")
-    if update_file_by_regex(
-        app_build_gradle_path,
-        [
-            (r'namespace\s+"[^"]+"', f'namespace "{app_id}"'),
-            (r'applicationId\s+"[^"]+"', f'applicationId "{app_id}"'),
-            (r'versionName\s+"[^"]+"', f'versionName "{version_name}"'),
-        ],
-    ):
-        log_success("已同步 app/build.gradle 的包名与版本号")
-
-    # 4) 写入 MainActivity（修正包名 + 处理麦克风权限）
-    main_activity_paths = list(
-        Path(ANDROID_DIR).glob("app/src/main/java/**/MainActivity.java")
-    ) + list(
-        Path(ANDROID_DIR).glob("app/src/main/java/**/MainActivity.kt")
-    )
-    for activity_path in main_activity_paths:
-        if str(activity_path).lower().endswith(".java"):
-            write_main_activity_java(str(activity_path), app_id, enable_zoom)
-            log_success(f"已更新 MainActivity（含录音权限处理）: {activity_path}")
-        else:
-            if update_file_by_regex(
-                str(activity_path),
-                [
-                    (r"^\s*package\s+[a-zA-Z0-9_.]+\s*;?", f"package {app_id}"),
-                ],
-            ):
-                log_success(f"已同步 MainActivity 包名: {activity_path}")
-
-    # 5) 同步状态栏颜色，保持与页面背景一致
-    styles_xml_path = os.path.join(ANDROID_DIR, "app", "src", "main", "res", "values", "styles.xml")
-    if os.path.exists(styles_xml_path):
-        styles_xml = f"""<?xml version="1.0" encoding="utf-8"?>
+def render_styles_xml(status_bar_color):
+    """生成 styles.xml 内容，状态栏颜色与页面背景一致"""
+    return f"""<?xml version="1.0" encoding="utf-8"?>
 <resources>
 
     <style name="AppTheme" parent="Theme.AppCompat.Light.DarkActionBar">
@@ -462,32 +714,170 @@ export default config;
     </style>
 </resources>
 """
-        write_file(styles_xml_path, styles_xml)
-        log_success(f"已同步状态栏颜色: {status_bar_color}")
 
-    # 6) 同步启动图标到 Android 资源（强制使用普通 mipmap 图标，避免 adaptive 前景放大）
-    source_icon = Path(icon_path)
+
+def render_android_manifest(content):
+    """在 </manifest> 前补齐缺失的权限声明"""
+    for permission in ANDROID_PERMISSIONS:
+        if permission not in content:
+            content = content.replace('</manifest>', f'    {permission}\n</manifest>')
+    return content
+
+
+def read_text_if_exists(path):
+    data = read_file_bytes(path)
+    return data.decode('utf-8') if data is not None else None
+
+
+def render_android_files(config):
+    """在内存中计算 Android 工程中所有由 args.yaml 生成/修改的文件
+
+    返回 (desired, deletions)：desired 为 {路径: 文本或字节}，deletions 为需要删除的文件列表。
+    只包含已存在的目标文件（模板由 cap add android 生成）。
+    """
+    from xml.sax.saxutils import escape as xml_escape
+    app_name = config["name"]
+    app_id = config["pkg"]
+    version_name = config["version"].lstrip('v')
+    enable_zoom = bool(config.get("enable_zoom", True))
+    status_bar_color, _ = get_status_bar_colors()
+    desired = {}
+    deletions = []
+
+    # 1) Android 字符串资源中的显示名和包名
+    strings_xml_path = os.path.join(ANDROID_DIR, "app", "src", "main", "res", "values", "strings.xml")
+    content = read_text_if_exists(strings_xml_path)
+    if content is not None:
+        desired[strings_xml_path] = apply_regex_replacements(content, [
+            (r"(<string name=\"app_name\">).*?(</string>)", rf"\1{xml_escape(app_name)}\2"),
+            (r"(<string name=\"title_activity_main\">).*?(</string>)", rf"\1{xml_escape(app_name)}\2"),
+            (r"(<string name=\"package_name\">).*?(</string>)", rf"\1{xml_escape(app_id)}\2"),
+            (r"(<string name=\"custom_url_scheme\">).*?(</string>)", rf"\1{xml_escape(app_id)}\2"),
+        ])
+
+    # 2) Gradle 的 namespace/applicationId/versionName
+    app_build_gradle_path = os.path.join(ANDROID_DIR, "app", "build.gradle")
+    content = read_text_if_exists(app_build_gradle_path)
+    if content is not None:
+        desired[app_build_gradle_path] = apply_regex_replacements(content, [
+            (r'namespace\s+"[^"]+"', f'namespace "{app_id}"'),
+            (r'applicationId\s+"[^"]+"', f'applicationId "{app_id}"'),
+            (r'versionName\s+"[^"]+"', f'versionName "{version_name}"'),
+        ])
+
+    # 3) MainActivity（修正包名 + 处理麦克风权限）
+    main_activity_java = render_main_activity_java(app_id, enable_zoom)
+    for activity_path in sorted(Path(ANDROID_DIR).glob("app/src/main/java/**/MainActivity.java")):
+        desired[str(activity_path)] = main_activity_java
+    for activity_path in sorted(Path(ANDROID_DIR).glob("app/src/main/java/**/MainActivity.kt")):
+        content = read_text_if_exists(str(activity_path))
+        desired[str(activity_path)] = apply_regex_replacements(content, [
+            (r"^\s*package\s+[a-zA-Z0-9_.]+\s*;?", f"package {app_id}"),
+        ])
+
+    # 4) 状态栏颜色，保持与页面背景一致
+    styles_xml_path = os.path.join(ANDROID_DIR, "app", "src", "main", "res", "values", "styles.xml")
+    if os.path.exists(styles_xml_path):
+        desired[styles_xml_path] = render_styles_xml(status_bar_color)
+
+    # 5) 权限声明
+    manifest_path = os.path.join(ANDROID_DIR, "app", "src", "main", "AndroidManifest.xml")
+    content = read_text_if_exists(manifest_path)
+    if content is not None:
+        desired[manifest_path] = render_android_manifest(content)
+
+    # 6) 启动图标（强制使用普通 mipmap 图标，避免 adaptive 前景放大）
+    source_icon = Path(config.get("icon", "./icon.png"))
     if not source_icon.is_absolute():
         source_icon = Path(os.getcwd()) / source_icon
-    if source_icon.exists() and source_icon.is_file():
-        mipmap_dirs = list(Path(ANDROID_DIR).glob("app/src/main/res/mipmap-*"))
-        for mipmap_dir in mipmap_dirs:
+    if source_icon.is_file():
+        icon_bytes = source_icon.read_bytes()
+        for mipmap_dir in sorted(Path(ANDROID_DIR).glob("app/src/main/res/mipmap-*")):
             for target_name in ("ic_launcher.png", "ic_launcher_round.png"):
                 target_icon = mipmap_dir / target_name
                 if target_icon.exists():
-                    shutil.copy2(str(source_icon), str(target_icon))
+                    desired[str(target_icon)] = icon_bytes
 
         # 移除 adaptive 图标定义，强制回退到普通 mipmap 图标，确保视觉比例与源图一致
         anydpi_v26 = Path(ANDROID_DIR) / "app" / "src" / "main" / "res" / "mipmap-anydpi-v26"
         for xml_name in ("ic_launcher.xml", "ic_launcher_round.xml"):
-            xml_path = anydpi_v26 / xml_name
-            if xml_path.exists():
-                xml_path.unlink()
-
-        log_success(f"已同步应用图标（普通 mipmap，保持原比例）: {source_icon}")
+            if (anydpi_v26 / xml_name).exists():
+                deletions.append(str(anydpi_v26 / xml_name))
     else:
         log_warning(f"图标文件不存在，跳过 launcher 图标同步: {source_icon}")
 
+    return desired, deletions
+
+
+def print_file_diff(path, current, desired):
+    """dry-run 模式下输出单个文件的差异"""
+    import difflib
+    if isinstance(desired, bytes) or current is None:
+        label = "新建" if current is None else "二进制内容不同"
+        print(f"--- {path}: {label}")
+        return
+    diff = difflib.unified_diff(
+        current.decode('utf-8').splitlines(keepends=True),
+        desired.splitlines(keepends=True),
+        fromfile=f"a/{Path(path).as_posix()}",
+        tofile=f"b/{Path(path).as_posix()}",
+    )
+    sys.stdout.writelines(diff)
+
+
+def write_capacitor_config(config, dry_run=False):
+    """写入 capacitor.config.ts（仅内容变化时），需在 cap sync 之前执行"""
+    path = os.path.join(ANDROID_BUILD_DIR, "capacitor.config.ts")
+    content = render_capacitor_config(config)
+    current = read_file_bytes(path)
+    if current == content.encode('utf-8'):
+        return False
+    if dry_run:
+        print_file_diff(path, current, content)
+        return True
+    write_if_changed(path, content)
+    log_success("已写入 capacitor.config.ts（含状态栏配置）")
+    return True
+
+
+def apply_android_app_metadata(config, dry_run=False):
+    """把 args.yaml 的基础信息应用到 Android 构建产物
+
+    先在内存中渲染全部目标文件，只写入内容有变化的文件；元数据不变时 Android 工程
+    保持字节与时间戳不变，Gradle 的 up-to-date 检查不会失效。返回变化的文件列表。
+    """
+    changed = []
+    if write_capacitor_config(config, dry_run):
+        changed.append(os.path.join(ANDROID_BUILD_DIR, "capacitor.config.ts"))
+
+    desired, deletions = render_android_files(config)
+    for path, content in desired.items():
+        current = read_file_bytes(path)
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        if current == data:
+            continue
+        changed.append(path)
+        if dry_run:
+            print_file_diff(path, current, content)
+        else:
+            write_if_changed(path, data)
+            log_success(f"已更新: {path}")
+
+    for path in deletions:
+        changed.append(path)
+        if dry_run:
+            print(f"--- {path}: 将删除")
+        else:
+            os.remove(path)
+            log_success(f"已删除 adaptive 图标定义: {path}")
+
+    total = len(desired) + len(deletions) + 1
+    if dry_run:
+        log_info(f"[dry-run] Android 工程共 {total} 个生成目标，{len(changed)} 个将变化")
+    else:
+        log_success(f"Android 元数据已同步：{len(changed)} 个文件变化，{total - len(changed)} 个保持不变")
+    return changed
+
 
 def cleanup_legacy_root_assets():
     """清理 android_build 根目录里历史遗留的重复资源"""
@@ -507,33 +897,367 @@ def cleanup_legacy_root_assets():
             log_info(f"已清理历史重复文件: {path}")
 
 
-def build_audio_manifest(audio_root_dir):
-    """为内置音频生成清单，供启动时预热到 CacheStorage"""
-    audio_root = Path(audio_root_dir)
-    files = []
-    digest = hashlib.sha256()
+def iter_sorted_files(root_dir, rel_prefix="", skip=None):
+    """按相对路径排序惰性遍历目录（os.scandir），逐个产出 (相对路径, 大小)
+
+    每层只对当前目录的条目排序，内存占用与目录宽度相关，而与文件总数无关；
+    顺序与 sorted(Path.rglob("*")) 一致。skip(rel, entry) 为真时跳过该文件或整个子目录。
+    """
+    with os.scandir(root_dir) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        rel = rel_prefix + entry.name
+        if skip and skip(rel, entry):
+            continue
+        if entry.is_dir():
+            yield from iter_sorted_files(entry.path, rel + "/", skip)
+        elif entry.is_file():
+            yield rel, entry.stat().st_size
+
 
-    if not audio_root.exists():
-        return {
-            "version": "empty",
-            "count": 0,
-            "files": []
+def skip_temp_files(rel, entry):
+    """跳过下载/写入中断残留的 .part/.tmp 文件"""
+    return entry.name.endswith((".part", ".tmp"))
+
+
+def build_audio_manifest(audio_root_dir, manifest_path, shards_dir):
+    """为内置音频流式生成按单元分片的清单，供启动时按需预热；返回 {"version", "count"}
+
+    shards_dir/<等级>/<Unit_N>.json 为单元分片（files 数组），manifest_path 为根索引，
+    只列出各分片的位置、文件数与版本，体积与单元数相关而与音频数量无关。
+    音频树按路径有序遍历，同一单元的文件连续出现，逐单元写出，峰值内存为一个单元。
+    不在 <等级>/<单元>/ 下的文件在排序中并不连续，单独收集，最后写入一个 _misc 分片。
+    """
+    import hashlib
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    if os.path.exists(shards_dir):
+        shutil.rmtree(shards_dir)
+    www_dir = os.path.dirname(manifest_path) or "."
+
+    digest = hashlib.sha256()
+    count = 0
+    shards = []
+
+    def flush(shard_key, files):
+        if not files:
+            return
+        level, unit = shard_key
+        shard_digest = hashlib.sha256()
+        for item in files:
+            shard_digest.update(item["path"].encode("utf-8"))
+            shard_digest.update(str(item["size"]).encode("utf-8"))
+        shard_path = os.path.join(shards_dir, level, f"{unit}.json")
+        write_json_atomic(shard_path, {"level": level, "unit": unit, "files": files}, indent=None)
+        shards.append({
+            "level": level,
+            "unit": unit,
+            "path": Path(os.path.relpath(shard_path, www_dir)).as_posix(),
+            "count": len(files),
+            "version": shard_digest.hexdigest()[:16],
+        })
+
+    if os.path.isdir(audio_root_dir):
+        current_key = None
+        files = []
+        misc_files = []
+        for rel, size in iter_sorted_files(audio_root_dir):
+            digest.update(rel.encode("utf-8"))
+            digest.update(str(size).encode("utf-8"))
+            count += 1
+            parts = rel.split("/")
+            if len(parts) < 3:
+                misc_files.append({"path": rel, "size": size})
+                continue
+            shard_key = (parts[0], parts[1])
+            if shard_key != current_key:
+                flush(current_key, files)
+                current_key = shard_key
+                files = []
+            files.append({"path": rel, "size": size})
+        flush(current_key, files)
+        flush(("_misc", "_misc"), misc_files)
+
+    summary = {"version": digest.hexdigest()[:16] if count else "empty", "count": count}
+    write_json_atomic(manifest_path, dict(summary, shards=shards), indent=None)
+    return summary
+
+
+# MP3 帧头解析（不依赖解码器）
+MPEG_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MPEG_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def parse_mp3_frame_header(data, pos):
+    """解析 pos 处的 MPEG 音频帧头，返回 (帧长, 每帧采样数, 采样率, 头部信息) 或 None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = {0: 2.5, 2: 2, 3: 1}.get((b1 >> 3) & 0x03)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+        samples = 384
+    elif layer == 2 or version == 1:
+        frame_length = 144 * bitrate // sample_rate + padding
+        samples = 1152
+    else:
+        frame_length = 72 * bitrate // sample_rate + padding
+        samples = 576
+    return frame_length, samples, sample_rate, {"version": version, "mono": (b3 >> 6) == 3}
+
+
+def parse_xing_header(data, pos, header):
+    """读取首帧中的 Xing/Info（及 LAME）信息，返回 (帧数, 编码延迟, 尾部填充)；没有则返回 None"""
+    side_info = (17 if header["mono"] else 32) if header["version"] == 1 else (9 if header["mono"] else 17)
+    offset = pos + 4 + side_info
+    if data[offset:offset + 4] not in (b"Xing", b"Info"):
+        return None
+
+    flags = int.from_bytes(data[offset + 4:offset + 8], "big")
+    cursor = offset + 8
+    frames = None
+    if flags & 0x01:
+        frames = int.from_bytes(data[cursor:cursor + 4], "big")
+        cursor += 4
+    if flags & 0x02:
+        cursor += 4
+    if flags & 0x04:
+        cursor += 100
+    if flags & 0x08:
+        cursor += 4
+
+    delay = padding = 0
+    if data[cursor:cursor + 4] == b"LAME" and cursor + 24 <= len(data):
+        raw = data[cursor + 21:cursor + 24]
+        delay = (raw[0] << 4) | (raw[1] >> 4)
+        padding = ((raw[1] & 0x0F) << 8) | raw[2]
+    return frames, delay, padding
+
+
+def parse_mp3_duration(path):
+    """按帧头计算 MP3 时长（秒）；无法识别为 MPEG 音频时返回 None
+
+    优先使用 Xing/Info 帧数与 LAME 延迟/填充信息（与浏览器无缝解码一致），
+    否则逐帧累加采样数（同时适用于 CBR 与 VBR）。
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    pos = 0
+    # 跳过 ID3v2 标签
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = ((data[6] & 0x7F) << 21) | ((data[7] & 0x7F) << 14) | ((data[8] & 0x7F) << 7) | (data[9] & 0x7F)
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    # 寻找首帧：要求紧随其后的也是有效帧头（或文件结尾），避免把数据误判为同步字
+    first = None
+    pos = data.find(b"\xff", pos)
+    while 0 <= pos < len(data) - 4:
+        parsed = parse_mp3_frame_header(data, pos)
+        if parsed:
+            next_pos = pos + parsed[0]
+            if next_pos >= len(data) or parse_mp3_frame_header(data, next_pos):
+                first = parsed
+                break
+        pos = data.find(b"\xff", pos + 1)
+    if first is None:
+        return None
+
+    frame_length, samples_per_frame, sample_rate, header = first
+    xing = parse_xing_header(data, pos, header)
+    if xing and xing[0]:
+        frames, delay, padding = xing
+        total_samples = frames * samples_per_frame - delay - padding
+        return max(total_samples, 0) / sample_rate
+
+    if xing:
+        # Info 帧本身不含音频
+        pos += frame_length
+    total_samples = 0
+    while pos < len(data) - 4:
+        parsed = parse_mp3_frame_header(data, pos)
+        if not parsed:
+            # 末尾的 ID3v1/APE 等标签，或损坏数据
+            break
+        total_samples += parsed[1]
+        pos += parsed[0]
+    return total_samples / sample_rate
+
+
+def build_unit_playlists(audio_root_dir, playlists_dir):
+    """按单元生成播放清单（片段时长与字节数），供批量播放预取与连续调度
+
+    输出 playlists/<等级>/<Unit_N>.json，clips 的键与 getFilePath() 的相对路径一致。
+    音频树按路径有序遍历，同一单元的文件连续出现，逐单元写出。
+    """
+    if os.path.exists(playlists_dir):
+        shutil.rmtree(playlists_dir)
+    if not os.path.isdir(audio_root_dir):
+        return 0
+
+    def flush(unit_key, clips):
+        if not unit_key or not clips:
+            return 0
+        level, unit = unit_key
+        known = [clip["duration"] for clip in clips.values() if clip["duration"] is not None]
+        playlist = {
+            "level": level,
+            "unit": unit,
+            "count": len(clips),
+            "duration": round(sum(known), 3),
+            "bytes": sum(clip["size"] for clip in clips.values()),
+            "clips": clips,
         }
+        write_json_atomic(os.path.join(playlists_dir, level, f"{unit}.json"), playlist, indent=None)
+        return 1
+
+    unit_count = 0
+    unknown = 0
+    current_key = None
+    clips = {}
+    for rel, size in iter_sorted_files(audio_root_dir):
+        parts = rel.split("/")
+        if len(parts) < 3 or not rel.lower().endswith(".mp3"):
+            continue
+        unit_key = (parts[0], parts[1])
+        if unit_key != current_key:
+            unit_count += flush(current_key, clips)
+            current_key = unit_key
+            clips = {}
+        try:
+            duration = parse_mp3_duration(os.path.join(audio_root_dir, rel))
+        except Exception:
+            duration = None
+        if duration is None:
+            unknown += 1
+        clips[rel] = {"duration": round(duration, 3) if duration is not None else None, "size": size}
+    unit_count += flush(current_key, clips)
+
+    if unknown:
+        log_warning(f"{unknown} 个音频不是可识别的 MP3 帧流，播放清单中时长为 null")
+    return unit_count
+
+
+# 单元卡片预渲染（模板与 js/ui.js 的 renderUnit() 保持一致）
+def escape_html(text):
+    """与 ui.js 的 escapeHtml() 一致：只转义 & < > \""""
+    return (str(text)
+            .replace("&", "&amp;")
+            .replace("<", "&lt;")
+            .replace(">", "&gt;")
+            .replace('"', "&quot;"))
+
+
+def highlight_char_html(text, char):
+    """与 ui.js 的 highlightChar() 一致"""
+    if not text or not char:
+        return escape_html(text or "")
+    safe_char = escape_html(char)
+    return escape_html(text).replace(safe_char, f'<span class="highlight">{safe_char}</span>')
+
+
+def render_btn_placeholder(text, btn_type, root_char, level, unit, is_small=False, index=None):
+    """按钮只写入数据属性；图标与提示随录音/播放模式变化，由运行时填充"""
+    btn_style = "padding: 2px; margin-left: 2px;" if is_small else ""
+    return (
+        f'<button class="play-btn" style="{btn_style}" data-text="{escape_html(text or "")}" '
+        f'data-type="{btn_type}" data-root-char="{escape_html(root_char or "")}" '
+        f'data-level="{escape_html(level or "")}" data-unit="{escape_html(unit or "")}" '
+        f'data-is-small="{"true" if is_small else "false"}" data-index="{"" if index is None else index}"></button>'
+    )
+
 
-    for file_path in sorted(audio_root.rglob("*")):
-        if not file_path.is_file():
+def render_unit_fragment(level, unit_name, unit_chars):
+    """渲染单元的静态卡片 HTML"""
+    parts = [f'<div class="unit-title"><span class="unit-title-text">{escape_html(unit_name)}</span></div>']
+    if not unit_chars:
+        parts.append('<div class="loading">本单元暂无内容</div>')
+        return "\n".join(parts) + "\n"
+
+    links = "，".join(
+        f'<span class="unit-char-link" data-char="{escape_html(char)}" style="cursor:pointer; user-select:none; margin: 0 2px;">{escape_html(char)}</span>'
+        for char in unit_chars
+    )
+    parts.append(
+        '<div style="text-align: center; margin: -10px 0 20px 0; padding: 0 16px; color: #666; '
+        f"font-size: 1.5rem; font-family: 'KaiTi', 'STKaiti', serif;\">{links}</div>"
+    )
+
+    for char, info in unit_chars.items():
+        char = str(char)
+        words = info.get("词") if isinstance(info, dict) and info.get("词") else []
+        sentence = info.get("句") if isinstance(info, dict) and info.get("句") else ""
+        words_html = " ".join(
+            f'<span class="word-item">{escape_html(word)}{render_btn_placeholder(word, "word", char, level, unit_name, True, idx)}</span>'
+            for idx, word in enumerate(words)
+        ) if isinstance(words, list) else ""
+        parts.append(
+            f'<div class="card" data-char="{escape_html(char)}">'
+            '<div class="char-header-container"><div class="char-with-btn">'
+            f'<div class="char-box"><div class="char-text">{escape_html(char)}</div></div>'
+            f'{render_btn_placeholder(char, "char", char, level, unit_name)}'
+            '</div></div>'
+            '<div class="content-box">'
+            '<div class="row"><div class="tag">词</div><div class="text-btn-row">'
+            f'<div class="text-content words">{words_html}</div>'
+            '</div></div>'
+            '<div class="row"><div class="tag">句</div><div class="text-btn-row">'
+            f'<div class="text-content sentence">{highlight_char_html(sentence, char)}</div>'
+            f'{render_btn_placeholder(sentence, "sentence", char, level, unit_name)}'
+            '</div></div>'
+            '</div></div>'
+        )
+    return "\n".join(parts) + "\n"
+
+
+def build_unit_fragments(yaml_dir, fragments_dir):
+    """为每个等级的每个单元生成 units/<level>/uNNN.html 与 index.json（单元名 -> 文件），返回单元总数"""
+    import hashlib
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    if os.path.exists(fragments_dir):
+        shutil.rmtree(fragments_dir)
+
+    total = 0
+    for yaml_path in sorted(Path(yaml_dir).glob("contents_*.yaml")):
+        level = yaml_path.stem[len("contents_"):]
+        with open(yaml_path, "r", encoding="utf-8") as f:
+            data = yaml.load(f, Loader=loader)
+        if not isinstance(data, dict):
             continue
-        rel = file_path.relative_to(audio_root).as_posix()
-        size = file_path.stat().st_size
-        files.append({"path": rel, "size": size})
-        digest.update(rel.encode("utf-8"))
-        digest.update(str(size).encode("utf-8"))
 
-    return {
-        "version": digest.hexdigest()[:16],
-        "count": len(files),
-        "files": files
-    }
+        level_dir = os.path.join(fragments_dir, level)
+        os.makedirs(level_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        units = {}
+        for position, (unit_name, unit_chars) in enumerate(data.items()):
+            unit_name = str(unit_name)
+            file_name = f"u{position:03d}.html"
+            html = render_unit_fragment(level, unit_name, unit_chars if isinstance(unit_chars, dict) else None)
+            write_file(os.path.join(level_dir, file_name), html)
+            digest.update(html.encode("utf-8"))
+            units[unit_name] = file_name
+        write_json_atomic(os.path.join(level_dir, "index.json"), {
+            "version": digest.hexdigest()[:16],
+            "units": units,
+        }, indent=None)
+        total += len(units)
+    return total
 
 
 def cleanup_post_build_artifacts():
@@ -562,12 +1286,1000 @@ def cleanup_post_build_artifacts():
 
     log_success(f"构建产物清理完成，共清理 {cleaned} 项")
 
+# 读取前端 Supabase 配置
+def read_supabase_config():
+    """从 js/config.js 中解析 SUPABASE_CONFIG（url/key/bucket），保持前后端同一份配置"""
+    config = {"url": "", "key": "", "bucket": "shizi-audio"}
+    if not os.path.exists(SUPABASE_CONFIG_JS):
+        return config
+
+    with open(SUPABASE_CONFIG_JS, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    for name in ("url", "key", "bucket"):
+        match = re.search(rf"\b{name}\s*:\s*['\"]([^'\"]*)['\"]", content)
+        if match:
+            config[name] = match.group(1).strip()
+    return config
+
+
+def write_json_atomic(path, data, indent=2):
+    """先写临时文件再原子替换，避免中断时留下半截 JSON
+
+    临时文件名唯一，并发写同一目标（多线程、多个构建）时互不覆盖，以最后一次替换为准。
+    """
+    import tempfile
+    target_dir = os.path.dirname(path) or "."
+    os.makedirs(target_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=target_dir,
+                                     prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     delete=False) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+def load_json_file(path, default=None):
+    """读取 JSON 文件，不存在或损坏时返回默认值"""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        log_warning(f"读取 JSON 失败，忽略: {path}, {e}")
+        return default
+
+
+def file_digests(path):
+    """流式计算文件的 md5 与 sha256"""
+    import hashlib
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(IO_CHUNK_SIZE), b""):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+class StorageClient:
+    """Supabase Storage / REST 的最小 HTTP 客户端（每个线程复用一条长连接）"""
+
+    def __init__(self, base_url, key, bucket):
+        import threading
+        import urllib.parse
+        parsed = urllib.parse.urlsplit(base_url.rstrip("/"))
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise ValueError(f"无效的存储地址: {base_url}")
+        self.scheme = parsed.scheme
+        self.netloc = parsed.netloc
+        self.base_path = parsed.path
+        self.bucket = bucket
+        self.headers = {"User-Agent": "shizi-build"}
+        if key:
+            self.headers["apikey"] = key
+            self.headers["Authorization"] = f"Bearer {key}"
+        self._local = threading.local()
+
+    def _connection(self):
+        import http.client
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = conn_cls(self.netloc, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """发送请求并返回响应对象；连接被服务端关闭时重连一次"""
+        import http.client
+        all_headers = dict(self.headers)
+        all_headers.update(headers or {})
+        url = self.base_path + path
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, url, body=body, headers=all_headers)
+                return conn.getresponse()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self._reset_connection()
+                if attempt == 2:
+                    raise
+
+    def list_objects(self, prefix=""):
+        """递归列出存储桶中 prefix 下的全部文件"""
+        import urllib.parse
+        files = []
+        pending = [prefix]
+        while pending:
+            current = pending.pop()
+            offset = 0
+            while True:
+                body = json.dumps({
+                    "prefix": current,
+                    "limit": AUDIO_PULL_PAGE_SIZE,
+                    "offset": offset,
+                    "sortBy": {"column": "name", "order": "asc"},
+                }).encode("utf-8")
+                res = self.request(
+                    "POST",
+                    f"/storage/v1/object/list/{urllib.parse.quote(self.bucket)}",
+                    body=body,
+                    headers={"Content-Type": "application/json"},
+                )
+                payload = res.read()
+                if res.status != 200:
+                    raise RuntimeError(f"列出存储对象失败: HTTP {res.status} {payload[:200]!r}")
+                items = json.loads(payload.decode("utf-8"))
+
+                for item in items:
+                    name = item.get("name")
+                    if not name or name == ".emptyFolderPlaceholder":
+                        continue
+                    full_path = f"{current}{name}"
+                    # Supabase 用 id 为空表示“目录”
+                    if item.get("id") is None:
+                        pending.append(full_path + "/")
+                        continue
+                    metadata = item.get("metadata") or {}
+                    files.append({
+                        "path": full_path,
+                        "size": int(metadata.get("size") or metadata.get("contentLength") or 0),
+                        "etag": str(metadata.get("eTag") or "").strip('"'),
+                    })
+
+                if len(items) < AUDIO_PULL_PAGE_SIZE:
+                    break
+                offset += len(items)
+
+        files.sort(key=lambda item: item["path"])
+        return files
+
+    def select_rows(self, table, columns, order):
+        """通过 PostgREST 分页读取整张表的指定列"""
+        import urllib.parse
+        rows = []
+        offset = 0
+        while True:
+            query = urllib.parse.urlencode({
+                "select": ",".join(columns),
+                "order": order,
+                "limit": AUDIO_PULL_PAGE_SIZE,
+                "offset": offset,
+            }, safe=",.")
+            res = self.request("GET", f"/rest/v1/{urllib.parse.quote(table)}?{query}")
+            payload = res.read()
+            if res.status != 200:
+                raise RuntimeError(f"读取数据表失败: HTTP {res.status} {payload[:200]!r}")
+            page = json.loads(payload.decode("utf-8"))
+            rows.extend(page)
+            if len(page) < AUDIO_PULL_PAGE_SIZE:
+                return rows
+            offset += len(page)
+
+    def open_object(self, path, headers=None):
+        """打开公开对象下载流"""
+        import urllib.parse
+        quoted = urllib.parse.quote(path, safe="/")
+        return self.request(
+            "GET",
+            f"/storage/v1/object/public/{urllib.parse.quote(self.bucket)}/{quoted}",
+            headers=headers,
+        )
+
+
+def pull_audio_file(client, remote, dest_root, previous):
+    """下载单个音频文件：大小/ETag 一致则跳过，.part 存在则断点续传，完成后校验摘要"""
+    dest = Path(dest_root) / remote["path"]
+    part = dest.with_name(dest.name + ".part")
+    etag = remote["etag"]
+    etag_is_md5 = bool(re.fullmatch(r"[0-9a-f]{32}", etag))
+
+    # 1) 大小与上次记录的 ETag 一致：无需读文件，直接跳过
+    if dest.is_file() and dest.stat().st_size == remote["size"]:
+        if previous and previous.get("etag") == etag and previous.get("size") == remote["size"]:
+            return "skipped", dict(previous)
+        md5_hex, sha256_hex = file_digests(dest)
+        if not etag_is_md5 or md5_hex == etag:
+            return "skipped", {"path": remote["path"], "size": remote["size"], "etag": etag, "sha256": sha256_hex}
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+
+    # 2) 断点续传：If-Range 保证远端文件已变化时服务端回退为完整下载
+    offset = part.stat().st_size if part.is_file() else 0
+    if offset >= remote["size"] > 0:
+        part.unlink()
+        offset = 0
+    headers = {}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        if etag:
+            headers["If-Range"] = f'"{etag}"'
+
+    res = client.open_object(remote["path"], headers=headers)
+    if res.status == 206:
+        mode = "ab"
+    elif res.status == 200:
+        mode = "wb"
+        offset = 0
+    else:
+        res.read()
+        raise RuntimeError(f"HTTP {res.status}")
+
+    with open(part, mode) as f:
+        while True:
+            chunk = res.read(IO_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+
+    # 3) 校验大小与摘要（Supabase 单段上传的 ETag 即内容 md5）
+    size = part.stat().st_size
+    if remote["size"] and size != remote["size"]:
+        raise RuntimeError(f"大小不一致: 期望 {remote['size']}，实际 {size}")
+    md5_hex, sha256_hex = file_digests(part)
+    if etag_is_md5 and md5_hex != etag:
+        part.unlink()
+        raise RuntimeError(f"摘要校验失败: ETag {etag}，实际 md5 {md5_hex}")
+
+    os.replace(str(part), str(dest))
+    status = "resumed" if mode == "ab" else "downloaded"
+    return status, {"path": remote["path"], "size": size, "etag": etag, "sha256": sha256_hex}
+
+
+def prune_local_audio(root_dir, prefix, remote_paths):
+    """删除 root_dir 中 prefix 范围内、远端已不存在的文件（含其 .part 残留），返回删除的相对路径"""
+    if not os.path.isdir(root_dir):
+        return []
+    removed = []
+    for rel, _ in list(iter_sorted_files(root_dir)):
+        if not rel.startswith(prefix):
+            continue
+        remote_rel = rel[:-len(".part")] if rel.endswith(".part") else rel
+        if remote_rel in remote_paths:
+            continue
+        os.remove(os.path.join(root_dir, rel))
+        removed.append(rel)
+    # 自底向上清理删空的目录
+    for dir_path, _, _ in sorted(os.walk(root_dir), key=lambda item: len(item[0]), reverse=True):
+        if dir_path != root_dir and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+    return removed
+
+
+def ffmpeg_encoder_command(input_path, output_path, settings):
+    """ffmpeg 编码链：去首尾静音 -> loudnorm 响度归一化 -> 按目标码率重新编码为 MP3
+
+    codec 已在 read_args_yaml 中限制为 AUDIO_MP3_CODECS，输出固定为 mp3 容器。
+    """
+    silence = (f"silenceremove=start_periods=1:start_threshold={settings['silence_db']}dB"
+               f":start_silence=0.05")
+    audio_filter = ",".join([
+        silence,
+        "areverse",
+        silence,
+        "areverse",
+        f"loudnorm=I={settings['loudness']}:TP=-1.5:LRA=11",
+    ])
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", input_path,
+        "-af", audio_filter,
+        "-ar", str(settings["sample_rate"]),
+        "-ac", str(settings["channels"]),
+        "-c:a", str(settings["codec"]),
+        "-b:a", str(settings["bitrate"]),
+        "-f", "mp3",
+        output_path,
+    ]
+
+
+# 可插拔的本地编码器；args.yaml 中 encoder 也可直接写成命令模板列表
+AUDIO_ENCODERS = {
+    "ffmpeg": ffmpeg_encoder_command,
+}
+
+
+def build_encoder_command(input_path, output_path, settings):
+    """根据配置生成编码命令，模板支持 {input} {output} {bitrate} {codec} 等占位符"""
+    encoder = settings.get("encoder") or "ffmpeg"
+    if isinstance(encoder, list):
+        values = dict(settings)
+        values.update({"input": input_path, "output": output_path})
+        return [str(arg).format(**values) for arg in encoder]
+    if encoder not in AUDIO_ENCODERS:
+        raise ValueError(f"未知的音频编码器: {encoder}")
+    return AUDIO_ENCODERS[encoder](input_path, output_path, settings)
+
+
+def encode_audio_clip(task):
+    """进程池任务：执行编码命令，成功后原子放入缓存"""
+    import subprocess
+    cmd, tmp_path, cache_path = task
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except Exception as e:
+        return cache_path, str(e)
+    if result.returncode != 0 or not os.path.isfile(tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return cache_path, (result.stderr or "").strip()[-300:] or f"exit {result.returncode}"
+    os.replace(tmp_path, cache_path)
+    return cache_path, None
+
+
+def cached_file_digest(index, file_path):
+    """从文件摘要索引取 {"size", "mtime", "sha256"}；(size, mtime) 变化时重新计算并更新索引"""
+    stat = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    cached = index.get(key)
+    if not (cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns):
+        _, sha256_hex = file_digests(file_path)
+        cached = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": sha256_hex}
+        index[key] = cached
+    return cached
+
+
+def prune_digest_index(index, root_dir, seen):
+    """删除索引中 root_dir 下本次遍历未见到的文件（已删除或被跳过）"""
+    prefix = os.path.join(os.path.abspath(root_dir), "")
+    for key in [k for k in index if k.startswith(prefix) and k not in seen]:
+        del index[key]
+
+
+def source_audio_digests(audio_root):
+    """计算源音频 sha256，返回 {相对路径: {"size", "mtime", "sha256"}}；未变化的文件不重复读取"""
+    index = load_json_file(FILE_DIGEST_INDEX, {}) or {}
+    digests = {}
+    seen = set()
+    for rel, _ in iter_sorted_files(audio_root, skip=skip_temp_files):
+        file_path = os.path.join(audio_root, rel)
+        seen.add(os.path.abspath(file_path))
+        if rel.endswith(".mp3"):
+            digests[rel] = cached_file_digest(index, file_path)
+    prune_digest_index(index, audio_root, seen)
+    write_json_atomic(FILE_DIGEST_INDEX, index, indent=None)
+    return digests
+
+
+def link_or_copy(src, dst):
+    """优先硬链接（不额外占空间），跨盘等失败时回退为复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def process_builtin_audio(settings):
+    """把 shizi-audio-cache 处理为归一化后的音频树，返回输出目录；编码器不可用时返回 None"""
+    import hashlib
+    from concurrent.futures import ProcessPoolExecutor
+    if not os.path.exists(BUILTIN_AUDIO_SRC_DIR):
+        log_warning(f"内置音频目录不存在，跳过处理: {BUILTIN_AUDIO_SRC_DIR}")
+        return None
+
+    probe_cmd = build_encoder_command("in.mp3", "out.mp3", settings)
+    if not shutil.which(probe_cmd[0]):
+        log_warning(f"音频编码器不可用，使用原始音频: {probe_cmd[0]}")
+        return None
+
+    # 设置变化时缓存键随之变化，旧结果自然失效
+    settings_key = json.dumps(
+        {k: v for k, v in settings.items() if k not in ("enabled", "workers")},
+        sort_keys=True, ensure_ascii=False,
+    )
+    digests = source_audio_digests(BUILTIN_AUDIO_SRC_DIR)
+    os.makedirs(AUDIO_ENCODED_CACHE_DIR, exist_ok=True)
+
+    outputs = {}
+    tasks = []
+    for rel, info in digests.items():
+        key = hashlib.sha256(f"{info['sha256']}\n{settings_key}".encode("utf-8")).hexdigest()
+        cache_path = os.path.join(AUDIO_ENCODED_CACHE_DIR, key[:2], f"{key}.mp3")
+        outputs[rel] = cache_path
+        if os.path.isfile(cache_path):
+            continue
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        src_path = os.path.abspath(os.path.join(BUILTIN_AUDIO_SRC_DIR, rel))
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        tasks.append((build_encoder_command(src_path, tmp_path, settings), tmp_path, cache_path))
+
+    log_info(f"内置音频共 {len(outputs)} 个，需重新处理 {len(tasks)} 个，命中缓存 {len(outputs) - len(tasks)} 个")
+
+    failed = set()
+    if tasks:
+        workers = int(settings.get("workers") or 0) or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for cache_path, error in executor.map(encode_audio_clip, tasks, chunksize=8):
+                if error:
+                    failed.add(cache_path)
+                    log_warning(f"音频处理失败，保留原始文件: {cache_path}, {error}")
+
+    # 重建输出树：处理成功的用缓存结果，失败的回退为原文件
+    if os.path.exists(AUDIO_PROCESSED_DIR):
+        shutil.rmtree(AUDIO_PROCESSED_DIR)
+    source_bytes = 0
+    output_bytes = 0
+    for rel, cache_path in outputs.items():
+        dst = os.path.join(AUDIO_PROCESSED_DIR, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        src = os.path.join(BUILTIN_AUDIO_SRC_DIR, rel)
+        link_or_copy(src if cache_path in failed else cache_path, dst)
+        source_bytes += digests[rel]["size"]
+        output_bytes += os.path.getsize(dst)
+
+    # 非 MP3 文件原样带入输出树，与未启用处理时的 copytree 结果一致
+    passthrough = 0
+    for rel, size in iter_sorted_files(BUILTIN_AUDIO_SRC_DIR, skip=skip_temp_files):
+        if rel in outputs:
+            continue
+        dst = os.path.join(AUDIO_PROCESSED_DIR, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        link_or_copy(os.path.join(BUILTIN_AUDIO_SRC_DIR, rel), dst)
+        passthrough += 1
+    if passthrough:
+        log_info(f"非 MP3 文件原样保留 {passthrough} 个")
+
+    log_success(f"内置音频处理完成: {source_bytes} -> {output_bytes} bytes，失败 {len(failed)} 个")
+    return AUDIO_PROCESSED_DIR
+
+
+# 共享产物缓存
+ARTIFACT_CACHE_VERSION = "1"
+# 未被任何条目引用的 blob 至少保留这么久，避免删掉并发写入者尚未写出清单的内容
+ARTIFACT_GC_GRACE_SECONDS = 3600
+ARTIFACT_GC_LOCK_STALE_SECONDS = 600
+WWW_DIR = os.path.join(ANDROID_BUILD_DIR, "www")
+APK_OUTPUT_DIR = os.path.join(ANDROID_DIR, "app", "build", "outputs", "apk", "debug")
+# 计算 APK 输入摘要时跳过构建输出、本机路径与 cap sync 复制的 www（www 以其阶段摘要代入）
+ANDROID_KEY_EXCLUDE_DIRS = {"build", ".gradle", ".idea", ".cxx"}
+ANDROID_KEY_EXCLUDE_RELS = {"local.properties", "app/src/main/assets/public"}
+
+
+def compute_stage_key(stage, inputs, extra=None, exclude_dirs=(), exclude_rels=()):
+    """计算阶段输入摘要：inputs 为 [(标签, 文件或目录)]，extra 为影响产物的其他参数
+
+    文件 sha256 与音频处理共用 FILE_DIGEST_INDEX，未变化的输入不重复读取。
+    """
+    import hashlib
+
+    def skip(rel, entry):
+        if rel in exclude_rels or skip_temp_files(rel, entry):
+            return True
+        return entry.name in exclude_dirs and entry.is_dir()
+
+    index = load_json_file(FILE_DIGEST_INDEX, {}) or {}
+    digest = hashlib.sha256()
+    digest.update(f"{ARTIFACT_CACHE_VERSION}\n{stage}\n".encode("utf-8"))
+    digest.update(json.dumps(extra or {}, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for label, path in inputs:
+        digest.update(f"\n[{label}]".encode("utf-8"))
+        if os.path.isdir(path):
+            seen = set()
+            for rel, _ in iter_sorted_files(path, skip=skip):
+                file_path = os.path.join(path, rel)
+                seen.add(os.path.abspath(file_path))
+                cached = cached_file_digest(index, file_path)
+                digest.update(f"\n{rel}\0{cached['sha256']}".encode("utf-8"))
+            prune_digest_index(index, path, seen)
+        elif os.path.isfile(path):
+            cached = cached_file_digest(index, path)
+            digest.update(f"\n\0{cached['sha256']}".encode("utf-8"))
+    write_json_atomic(FILE_DIGEST_INDEX, index, indent=None)
+    return digest.hexdigest()
+
+
+def compute_www_stage_key(config):
+    """www 阶段：源码、课程数据、内置音频、图标与音频处理参数"""
+    settings = config["audio_processing"]
+    extra = {"audio_processing": settings if settings["enabled"] else None}
+    if settings["enabled"]:
+        # 编码器缺失时会回退为原始音频，产物不同
+        extra["encoder_available"] = bool(shutil.which(build_encoder_command("in.mp3", "out.mp3", settings)[0]))
+    inputs = [
+        ("build.py", os.path.abspath(__file__)),
+        ("index.html", "index.html"),
+        ("js", "js"),
+        ("yaml", "yaml"),
+        ("audio", BUILTIN_AUDIO_SRC_DIR),
+        ("audio-records", AUDIO_RECORDS_SNAPSHOT),
+        ("icon", config.get("icon", "./icon.png")),
+    ]
+    return compute_stage_key("www", inputs, extra)
+
+
+def compute_apk_stage_key(config):
+    """APK 阶段：sync 后的 Android 工程、Capacitor 依赖版本与 www 阶段摘要"""
+    inputs = [
+        ("build.py", os.path.abspath(__file__)),
+        ("package.json", os.path.join(ANDROID_BUILD_DIR, "package.json")),
+        ("package-lock.json", os.path.join(ANDROID_BUILD_DIR, "package-lock.json")),
+        ("android", ANDROID_DIR),
+    ]
+    extra = {"www": compute_www_stage_key(config), "task": "assembleDebug"}
+    return compute_stage_key("apk", inputs, extra, ANDROID_KEY_EXCLUDE_DIRS, ANDROID_KEY_EXCLUDE_RELS)
+
+
+def replace_directory(staging_dir, dest_dir):
+    """用已准备好的同级目录替换目标目录：两次同盘 rename，旧目录最后删除"""
+    backup_dir = None
+    if os.path.exists(dest_dir):
+        backup_dir = f"{dest_dir}.old-{os.getpid()}"
+        if os.path.exists(backup_dir):
+            shutil.rmtree(backup_dir)
+        os.rename(dest_dir, backup_dir)
+    try:
+        os.rename(staging_dir, dest_dir)
+    except OSError:
+        if backup_dir:
+            os.rename(backup_dir, dest_dir)
+        raise
+    if backup_dir:
+        shutil.rmtree(backup_dir, ignore_errors=True)
+
+
+class DirectoryArtifactCache:
+    """基于目录（可以是多台构建机共享的挂载点）的内容寻址产物缓存
+
+    blobs/<sha256 前两位>/<sha256>    文件内容，按内容寻址，不同条目共享同一份
+    entries/<阶段>/<输入摘要>.json    条目清单：相对路径 -> {sha256, size}；mtime 即最近使用时间
+
+    所有写入先落到唯一命名的临时文件再 os.replace，多个写入者并发写同一条目时结果一致；
+    恢复时发现 blob 缺失（例如刚被淘汰）按未命中处理。
+    其他后端只需实现 restore/store/evict 并登记到 ARTIFACT_CACHE_BACKENDS。
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.entries_dir = os.path.join(root, "entries")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def blob_path(self, sha256_hex):
+        return os.path.join(self.blobs_dir, sha256_hex[:2], sha256_hex)
+
+    def entry_path(self, stage, key):
+        return os.path.join(self.entries_dir, stage, f"{key}.json")
+
+    def temp_path(self, path):
+        import uuid
+        # 不同构建机的 pid 可能相同，用 uuid 保证临时文件名唯一
+        return f"{path}.{uuid.uuid4().hex}.tmp"
+
+    def restore(self, stage, key, dest_dir):
+        """命中时把条目恢复到 dest_dir（整体替换）并返回 True"""
+        entry_path = self.entry_path(stage, key)
+        entry = load_json_file(entry_path)
+        if not isinstance(entry, dict) or not isinstance(entry.get("files"), dict):
+            return False
+
+        staging_dir = f"{dest_dir}.restore-{os.getpid()}"
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        try:
+            os.makedirs(staging_dir)
+            for rel, info in entry["files"].items():
+                dst = os.path.join(staging_dir, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(self.blob_path(info["sha256"]), dst)
+                if os.path.getsize(dst) != info["size"]:
+                    raise OSError(f"大小不一致: {rel}")
+            replace_directory(staging_dir, dest_dir)
+        except (OSError, KeyError) as e:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            log_warning(f"产物缓存条目不可用，按未命中处理: {stage}/{key[:12]}, {e}")
+            return False
+
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return True
+
+    def store(self, stage, key, src_dir):
+        """把 src_dir 写入缓存，返回写入的总字节数"""
+        files = {}
+        total_bytes = 0
+        for rel, size in iter_sorted_files(src_dir, skip=skip_temp_files):
+            path = os.path.join(src_dir, rel)
+            _, sha256_hex = file_digests(path)
+            blob = self.blob_path(sha256_hex)
+            if os.path.exists(blob):
+                # 刷新 mtime，避免在回收宽限期内被当作孤儿删除
+                os.utime(blob)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                tmp_path = self.temp_path(blob)
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, blob)
+            files[rel] = {"sha256": sha256_hex, "size": size}
+            total_bytes += size
+
+        entry_path = self.entry_path(stage, key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = self.temp_path(entry_path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stage": stage, "key": key, "bytes": total_bytes, "files": files}, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+        return total_bytes
+
+    def evict(self):
+        """按最近使用时间淘汰条目直到总大小不超过上限，再回收无引用的 blob"""
+        import time
+        lock_path = os.path.join(self.root, "gc.lock")
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            # 其他构建机正在回收；锁文件过旧说明持有者已退出
+            try:
+                if time.time() - os.path.getmtime(lock_path) > ARTIFACT_GC_LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            return
+
+        try:
+            entries = []
+            for stage_entry in os.scandir(self.entries_dir):
+                if not stage_entry.is_dir():
+                    continue
+                for entry in os.scandir(stage_entry.path):
+                    if entry.name.endswith(".json"):
+                        entries.append((entry.stat().st_mtime, entry.path))
+            entries.sort(reverse=True)
+
+            # 从最近使用的条目开始累计（共享 blob 只计一次），超出上限的条目删除
+            kept_blobs = set()
+            kept_bytes = 0
+            evicted = 0
+            for _, entry_path in entries:
+                entry = load_json_file(entry_path)
+                files = entry.get("files") if isinstance(entry, dict) else None
+                if not isinstance(files, dict):
+                    self.remove_quietly(entry_path)
+                    continue
+                new_blobs = {info["sha256"]: info["size"] for info in files.values() if info["sha256"] not in kept_blobs}
+                entry_bytes = sum(new_blobs.values())
+                if kept_blobs and kept_bytes + entry_bytes > self.max_bytes:
+                    self.remove_quietly(entry_path)
+                    evicted += 1
+                    continue
+                kept_blobs.update(new_blobs)
+                kept_bytes += entry_bytes
+
+            cutoff = time.time() - ARTIFACT_GC_GRACE_SECONDS
+            removed_blobs = 0
+            for prefix_entry in os.scandir(self.blobs_dir):
+                if not prefix_entry.is_dir():
+                    continue
+                for blob in os.scandir(prefix_entry.path):
+                    if blob.name in kept_blobs or blob.stat().st_mtime > cutoff:
+                        continue
+                    self.remove_quietly(blob.path)
+                    removed_blobs += 1
+
+            if evicted or removed_blobs:
+                log_info(f"产物缓存回收: 淘汰 {evicted} 个条目，删除 {removed_blobs} 个文件，保留 {kept_bytes / 1024 / 1024:.1f} MiB")
+        finally:
+            self.remove_quietly(lock_path)
+
+    def remove_quietly(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+ARTIFACT_CACHE_BACKENDS = {
+    "dir": DirectoryArtifactCache,
+}
+
+
+def open_artifact_cache(settings):
+    """按配置创建产物缓存后端；环境变量 SHIZI_ARTIFACT_CACHE 优先于 args.yaml，均未设置时返回 None"""
+    root = os.environ.get(ARTIFACT_CACHE_ENV) or settings.get("dir")
+    if not root:
+        return None
+    backend = ARTIFACT_CACHE_BACKENDS.get(settings.get("backend"))
+    if backend is None:
+        log_warning(f"未知的产物缓存后端，已禁用: {settings.get('backend')}")
+        return None
+    try:
+        return backend(root, int(float(settings["max_size_mb"]) * 1024 * 1024))
+    except OSError as e:
+        log_warning(f"产物缓存目录不可用，已禁用: {root}, {e}")
+        return None
+
+
+def run_cached_stage(cache, stage, key, output_dir, produce):
+    """命中缓存时原子恢复 output_dir 并跳过 produce；未命中时执行 produce 并写回缓存"""
+    if cache is not None and cache.restore(stage, key, output_dir):
+        log_success(f"命中产物缓存: {stage} ({key[:12]})")
+        return True
+
+    if not produce():
+        return False
+
+    store_stage_artifact(cache, stage, key, output_dir)
+    return True
+
+
+def store_stage_artifact(cache, stage, key, output_dir):
+    """把阶段输出写回缓存并按容量淘汰；失败只告警，不影响构建"""
+    if cache is None:
+        return
+    try:
+        stored_bytes = cache.store(stage, key, output_dir)
+        log_info(f"已写入产物缓存: {stage} ({key[:12]}, {stored_bytes} bytes)")
+        cache.evict()
+    except OSError as e:
+        log_warning(f"写入产物缓存失败（不影响构建）: {stage}, {e}")
+
+
+# 课程数据校验
+LINT_CACHE = os.path.join(BUILD_CACHE_DIR, "lint-cache.json")
+LINT_VERSION = "1"
+HANZI_TABLE_YAML = os.path.join("yaml", "hanzi_3500.yaml")
+CHINESE_DIGITS = {'零': 0, '一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+CHINESE_UNITS = {'十': 10, '百': 100, '千': 1000}
+
+
+_strict_yaml_loader = None
+
+
+def get_strict_yaml_loader():
+    """返回校验用的 YAML Loader：优先使用 libyaml 的 C 解析器，并拒绝重复键（safe_load 会静默覆盖）"""
+    global _strict_yaml_loader
+    if _strict_yaml_loader is not None:
+        return _strict_yaml_loader
+
+    import yaml
+    base_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    class StrictYamlLoader(base_loader):
+        def construct_mapping(self, node, deep=False):
+            seen = set()
+            for key_node, _ in node.value:
+                key = self.construct_object(key_node, deep=deep)
+                if key in seen:
+                    raise yaml.constructor.ConstructorError(
+                        None, None, f"重复的键: {key}", key_node.start_mark)
+                seen.add(key)
+            return super().construct_mapping(node, deep=deep)
+
+    _strict_yaml_loader = StrictYamlLoader
+    return _strict_yaml_loader
+
+
+def get_unit_code(unit):
+    """与 audio-manager.js 的 getUnitCode() 保持一致；无法解析时返回 None"""
+    num_match = re.search(r"\d+", unit)
+    if num_match:
+        return num_match.group(0)
+
+    match = re.search(r"第(.+)单元", unit)
+    if not match:
+        return None
+
+    result = 0
+    temp = 0
+    has_num = False
+    for ch in match.group(1):
+        if ch in CHINESE_DIGITS:
+            temp = CHINESE_DIGITS[ch]
+            has_num = True
+        elif ch in CHINESE_UNITS:
+            if ch == '十' and temp == 0 and result == 0:
+                temp = 1
+            result += temp * CHINESE_UNITS[ch]
+            temp = 0
+            has_num = True
+    result += temp
+    return str(result) if has_num else None
+
+
+def lint_contents_data(data):
+    """校验课程结构：单元 -> 字 -> {词: list, 句: str}，返回 (问题列表, 字 -> 单元列表)"""
+    issues = []
+    chars = {}
+    if not isinstance(data, dict):
+        return [("error", "顶层应为“单元 -> 字”的映射")], chars
+
+    unit_codes = {}
+    for unit, unit_chars in data.items():
+        unit = str(unit)
+        code = get_unit_code(unit)
+        if code is None:
+            issues.append(("error", f"{unit}: 单元名无法被 getUnitCode() 解析为编号"))
+        elif code in unit_codes:
+            issues.append(("error", f"{unit}: 单元编号 {code} 与 {unit_codes[code]} 冲突，音频路径会重叠"))
+        else:
+            unit_codes[code] = unit
+
+        if not isinstance(unit_chars, dict):
+            issues.append(("error", f"{unit}: 单元内容应为“字 -> 词/句”的映射"))
+            continue
+
+        for char, info in unit_chars.items():
+            char = str(char)
+            if len(char) != 1:
+                issues.append(("error", f"{unit}/{char}: 键应为单个汉字"))
+            chars.setdefault(char, []).append(unit)
+
+            if not isinstance(info, dict):
+                issues.append(("error", f"{unit}/{char}: 内容应包含 词 和 句"))
+                continue
+            unknown = sorted(set(info) - {"词", "句"})
+            if unknown:
+                issues.append(("warning", f"{unit}/{char}: 未知字段 {unknown}"))
+
+            words = info.get("词")
+            if not isinstance(words, list) or not words:
+                issues.append(("error", f"{unit}/{char}: 词 应为非空列表"))
+            else:
+                for word in words:
+                    if not isinstance(word, str) or not word.strip():
+                        issues.append(("error", f"{unit}/{char}: 词 列表包含非文本项 {word!r}"))
+                    elif char not in word:
+                        issues.append(("warning", f"{unit}/{char}: 词“{word}”不包含本字"))
+                if len(set(words)) != len(words):
+                    issues.append(("warning", f"{unit}/{char}: 词 列表有重复项"))
+
+            sentence = info.get("句")
+            if not isinstance(sentence, str) or not sentence.strip():
+                issues.append(("error", f"{unit}/{char}: 句 应为非空文本"))
+            elif char not in sentence:
+                issues.append(("warning", f"{unit}/{char}: 句 不包含本字"))
+
+    return issues, chars
+
+
+def lint_hanzi_table_data(data):
+    """校验字库：键为 '0x4e00' 形式的码点，值为对应汉字"""
+    issues = []
+    table = {}
+    if not isinstance(data, dict):
+        return [("error", "顶层应为“码点 -> 汉字”的映射")], table
+
+    for key, char in data.items():
+        key = str(key)
+        char = str(char)
+        if not re.fullmatch(r"0x[0-9a-fA-F]+", key) or len(char) != 1:
+            issues.append(("error", f"{key}: 无效条目 {char!r}"))
+            continue
+        if int(key, 16) != ord(char):
+            issues.append(("error", f"{key}: 码点与汉字 {char}（{hex(ord(char))}）不一致"))
+        table[char] = key
+    return issues, table
+
+
+def lint_yaml_file(path):
+    """解析并校验单个 YAML（进程池任务），返回可缓存的结果"""
+    import yaml
+    result = {"issues": [], "kind": "contents", "chars": {}}
+    if os.path.normpath(path) == os.path.normpath(HANZI_TABLE_YAML):
+        result["kind"] = "hanzi"
+    elif not os.path.basename(path).startswith("contents_"):
+        result["kind"] = "other"
+
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            data = yaml.load(f, Loader=get_strict_yaml_loader())
+    except Exception as e:
+        result["issues"] = [("error", f"YAML 解析失败: {e}")]
+        return result
+
+    if result["kind"] == "contents":
+        result["issues"], result["chars"] = lint_contents_data(data)
+    elif result["kind"] == "hanzi":
+        result["issues"], result["chars"] = lint_hanzi_table_data(data)
+    return result
+
+
+def lint(workers=None):
+    """校验 yaml/*.yaml，返回是否无错误；结果按文件摘要缓存
+
+    workers 默认取 CPU 数；为 1 时在当前进程内逐个解析，不启动进程池。
+    """
+    import hashlib
+    log_step("校验课程数据")
+    yaml_files = sorted(str(p) for p in Path("yaml").glob("*.yaml"))
+    if not yaml_files:
+        log_warning("yaml 目录下没有课程文件")
+        return True
+
+    cache = load_json_file(LINT_CACHE, {}) or {}
+    if cache.get("version") != LINT_VERSION:
+        cache = {"version": LINT_VERSION, "files": {}}
+
+    results = {}
+    pending = []
+    for path in yaml_files:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        cached = cache["files"].get(path)
+        if cached and cached["digest"] == digest:
+            results[path] = cached["result"]
+        else:
+            pending.append((path, digest))
+
+    if pending:
+        import yaml
+        from concurrent.futures import ProcessPoolExecutor
+        loader_name = "C" if hasattr(yaml, "CSafeLoader") else "Python"
+        log_info(f"解析 {len(pending)} 个文件（{loader_name} YAML 解析器），命中缓存 {len(results)} 个")
+        workers = min(len(pending), workers or os.cpu_count() or 1)
+        paths = [p for p, _ in pending]
+        if workers == 1:
+            parsed = list(map(lint_yaml_file, paths))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(lint_yaml_file, paths))
+        for (path, digest), result in zip(pending, parsed):
+            results[path] = result
+            cache["files"][path] = {"digest": digest, "result": result}
+        cache["files"] = {path: cache["files"][path] for path in yaml_files}
+        write_json_atomic(LINT_CACHE, cache, indent=None)
+    else:
+        log_info(f"全部 {len(results)} 个文件命中校验缓存")
+
+    issues = []
+    for path in yaml_files:
+        issues.extend((severity, f"{path}: {message}") for severity, message in results[path]["issues"])
+
+    # 跨文件检查：字库覆盖与跨等级重复
+    hanzi_table = {}
+    if HANZI_TABLE_YAML in results:
+        hanzi_table = results[HANZI_TABLE_YAML]["chars"]
+    occurrences = {}
+    for path in yaml_files:
+        if results[path]["kind"] != "contents":
+            continue
+        level = Path(path).stem.replace("contents_", "")
+        for char, units in results[path]["chars"].items():
+            occurrences.setdefault(char, []).extend(f"{level}/{unit}" for unit in units)
+            if hanzi_table and char not in hanzi_table:
+                issues.append(("warning", f"{path}: {char}（{hex(ord(char[0]))}）不在 {HANZI_TABLE_YAML} 中"))
+
+    for char, places in sorted(occurrences.items()):
+        if len(places) > 1:
+            issues.append(("warning", f"{char} 重复出现: {', '.join(places)}"))
+
+    errors = [message for severity, message in issues if severity == "error"]
+    warnings = [message for severity, message in issues if severity == "warning"]
+    for message in warnings:
+        log_warning(message)
+    for message in errors:
+        log_error(message)
+
+    if errors:
+        log_error(f"课程数据校验失败: {len(errors)} 个错误，{len(warnings)} 个警告")
+        return False
+    log_success(f"课程数据校验通过: {len(yaml_files)} 个文件，{len(warnings)} 个警告")
+    return True
+
+
 # 初始化功能
 def init():
-    """初始化 Capacitor Android 项目"""
-    if not check_environment():
-        return False
-    
+    """初始化 Capacitor Android 项目
+
+    按阶段图执行：环境检查通过后写 package.json、npm install，期间并行校验课程数据、生成 www；
+    cap add android 需要 www 与 cap init 都就绪，之后渲染元数据与配置 Gradle/SDK。
+    """
     log_step("初始化 Capacitor Android 项目")
     
     # 创建必要的目录
@@ -575,8 +2287,48 @@ def init():
     
     # 读取配置
     config = read_args_yaml()
+
+    # 使用绝对路径
+    cap_cmd = os.path.abspath(os.path.join(ANDROID_BUILD_DIR, "node_modules", ".bin", "cap.cmd"))
+
+    def locate_cap():
+        if not os.path.exists(cap_cmd):
+            log_error(f"cap 命令不存在: {cap_cmd}")
+            return False
+        log_info(f"使用 cap 命令: {cap_cmd}")
+        return True
+
+    stages = [
+        # 环境检查失败时后续阶段全部取消，不写入任何文件，错误信息不被淹没
+        BuildStage("check_environment", func=check_environment),
+        BuildStage("package_json", func=lambda: write_package_json(config), deps=("check_environment",)),
+        BuildStage("npm_install", cmd=["npm", "install"], cwd=ANDROID_BUILD_DIR,
+                   deps=("package_json",), timeout=STAGE_TIMEOUTS["npm_install"]),
+        BuildStage("lint", func=lint, deps=("check_environment",)),
+        BuildStage("www", func=lambda: prepare_www(config), deps=("lint",)),
+        BuildStage("locate_cap", func=locate_cap, deps=("npm_install",)),
+        # 初始化时直接传入应用名称和包名，避免落回默认值
+        BuildStage("cap_init", cmd=[cap_cmd, "init", config["name"], config["pkg"]], cwd=ANDROID_BUILD_DIR,
+                   deps=("locate_cap",), timeout=STAGE_TIMEOUTS["cap_init"]),
+        BuildStage("cap_add", cmd=[cap_cmd, "add", "android"], cwd=ANDROID_BUILD_DIR,
+                   deps=("cap_init", "www"), timeout=STAGE_TIMEOUTS["cap_add"]),
+        # 强制把 args.yaml 信息写入构建工程，避免后续步骤覆盖
+        BuildStage("render_android", func=lambda: apply_android_app_metadata(config), deps=("cap_add",)),
+        # 配置 Gradle 使用本地分发包（只改 gradle-wrapper.properties，可与渲染并行）
+        BuildStage("configure_local_gradle", func=configure_local_gradle, deps=("cap_add",)),
+        # 配置 SDK 版本（与渲染都会改 app/build.gradle，需排在其后）
+        BuildStage("configure_sdk_version", func=configure_sdk_version, deps=("render_android",)),
+    ]
+    if not run_stages(stages):
+        log_error("项目初始化失败")
+        return False
     
-    # 创建 package.json
+    log_success("项目初始化完成")
+    return True
+
+
+def write_package_json(config):
+    """创建 android_build/package.json"""
     package_json = {
         "name": "shizi-android",
         "version": config["version"].lstrip('v'),
@@ -600,49 +2352,6 @@ def init():
     with open(package_json_path, 'w', encoding='utf-8') as f:
         json.dump(package_json, f, indent=2, ensure_ascii=False)
     log_success(f"创建 package.json 文件")
-    
-    # 安装依赖
-    log_info("安装 Capacitor 依赖...")
-    code, stdout, stderr = run_command(["npm", "install"], cwd=ANDROID_BUILD_DIR)
-    if code != 0:
-        log_error("安装依赖失败")
-        return False
-    log_success("依赖安装成功")
-    
-    # 初始化 Capacitor
-    log_info("初始化 Capacitor...")
-    # 使用绝对路径
-    cap_cmd = os.path.abspath(os.path.join(ANDROID_BUILD_DIR, "node_modules", ".bin", "cap.cmd"))
-    if not os.path.exists(cap_cmd):
-        log_error(f"cap 命令不存在: {cap_cmd}")
-        return False
-    log_info(f"使用 cap 命令: {cap_cmd}")
-    
-    # 初始化时直接传入应用名称和包名，避免落回默认值
-    code, stdout, stderr = run_command([cap_cmd, "init", config["name"], config["pkg"]], cwd=ANDROID_BUILD_DIR)
-    if code != 0:
-        log_error("初始化 Capacitor 失败")
-        return False
-    log_success("Capacitor 初始化成功")
-    
-    # 添加 Android 平台
-    log_info("添加 Android 平台...")
-    code, stdout, stderr = run_command([cap_cmd, "add", "android"], cwd=ANDROID_BUILD_DIR)
-    if code != 0:
-        log_error("添加 Android 平台失败")
-        return False
-    log_success("Android 平台添加成功")
-
-    # 强制把 args.yaml 信息写入构建工程，避免后续步骤覆盖
-    apply_android_app_metadata(config)
-    
-    # 配置 Gradle 使用本地分发包
-    configure_local_gradle()
-    
-    # 配置 SDK 版本
-    configure_sdk_version()
-    
-    log_success("项目初始化完成")
     return True
 
 # 配置本地 Gradle 分发包
@@ -723,18 +2432,12 @@ def configure_sdk_version():
         except Exception as e:
             log_error(f"配置 SDK 版本失败: {e}")
 
-# 同步功能
-def sync():
-    """同步 Web 代码到 Android 项目"""
-    log_step("同步 Web 代码到 Android 项目")
-    
+def copy_web_assets():
+    """复制 index.html/js/yaml/内置音频/图标 到 android_build/www，并生成音频清单"""
     # 创建 www 目录
     www_dir = os.path.join(ANDROID_BUILD_DIR, "www")
     os.makedirs(www_dir, exist_ok=True)
     log_info(f"创建 www 目录: {www_dir}")
-
-    # 统一只使用 www 作为 Web 资源根目录，清理历史重复文件
-    cleanup_legacy_root_assets()
     
     # 复制 index.html 到 www 目录
     if os.path.exists("index.html"):
@@ -762,23 +2465,43 @@ def sync():
             shutil.rmtree(yaml_dest)
         shutil.copytree("yaml", yaml_dest)
         log_success("复制 yaml 目录成功")
+
+        # 预渲染单元卡片，运行时切换单元只需替换 HTML 片段
+        unit_count = build_unit_fragments("yaml", UNIT_FRAGMENTS_DIR)
+        log_success(f"生成单元卡片片段成功: {UNIT_FRAGMENTS_DIR} (共 {unit_count} 个单元)")
     else:
         log_error("yaml 目录不存在")
         return False
 
     # 复制内置音频到 www/audio，并生成音频清单
     if os.path.exists(BUILTIN_AUDIO_SRC_DIR):
+        config = read_args_yaml()
+        audio_src_dir = BUILTIN_AUDIO_SRC_DIR
+        if config["audio_processing"]["enabled"]:
+            audio_src_dir = process_builtin_audio(config["audio_processing"]) or BUILTIN_AUDIO_SRC_DIR
+
         if os.path.exists(BUILTIN_AUDIO_WWW_DIR):
             shutil.rmtree(BUILTIN_AUDIO_WWW_DIR)
-        shutil.copytree(BUILTIN_AUDIO_SRC_DIR, BUILTIN_AUDIO_WWW_DIR)
-        log_success(f"复制内置音频目录成功: {BUILTIN_AUDIO_SRC_DIR} -> {BUILTIN_AUDIO_WWW_DIR}")
+        # 忽略 pull-audio 中断残留的 .part 文件
+        shutil.copytree(audio_src_dir, BUILTIN_AUDIO_WWW_DIR, ignore=shutil.ignore_patterns("*.part"))
+        log_success(f"复制内置音频目录成功: {audio_src_dir} -> {BUILTIN_AUDIO_WWW_DIR}")
 
-        audio_manifest = build_audio_manifest(BUILTIN_AUDIO_WWW_DIR)
-        with open(BUILTIN_AUDIO_MANIFEST, "w", encoding="utf-8") as f:
-            json.dump(audio_manifest, f, ensure_ascii=False, indent=2)
+        audio_manifest = build_audio_manifest(BUILTIN_AUDIO_WWW_DIR, BUILTIN_AUDIO_MANIFEST, BUILTIN_AUDIO_MANIFEST_SHARDS_DIR)
         log_success(f"生成内置音频清单成功: {BUILTIN_AUDIO_MANIFEST} (共 {audio_manifest['count']} 个文件)")
+
+        playlist_count = build_unit_playlists(BUILTIN_AUDIO_WWW_DIR, BUILTIN_AUDIO_PLAYLISTS_DIR)
+        log_success(f"生成单元播放清单成功: {BUILTIN_AUDIO_PLAYLISTS_DIR} (共 {playlist_count} 个单元)")
     else:
         log_warning(f"内置音频目录不存在，跳过打包: {BUILTIN_AUDIO_SRC_DIR}")
+
+    # 复制 audio_records 快照，应用只需增量查询快照之后的新记录
+    if os.path.exists(AUDIO_RECORDS_SNAPSHOT):
+        shutil.copy2(AUDIO_RECORDS_SNAPSHOT, AUDIO_RECORDS_WWW)
+        log_success(f"复制 audio_records 快照成功: {AUDIO_RECORDS_SNAPSHOT} -> {AUDIO_RECORDS_WWW}")
+    else:
+        if os.path.exists(AUDIO_RECORDS_WWW):
+            os.remove(AUDIO_RECORDS_WWW)
+        log_warning("audio_records 快照不存在，应用将回退为全表查询（可执行 snapshot-records 生成）")
     
     # 复制 args.yaml 指定图标到 www 目录
     config = read_args_yaml()
@@ -788,94 +2511,108 @@ def sync():
         log_success(f"复制图标成功: {source_icon} -> www/icon.png")
     else:
         log_warning(f"图标文件不存在: {source_icon}")
-    
-    # 执行 Capacitor 同步
-    config = read_args_yaml()
-    apply_android_app_metadata(config)
 
-    log_info("执行 Capacitor 同步...")
-    code, stdout, stderr = run_command(["npx.cmd", "cap", "sync"], cwd=ANDROID_BUILD_DIR)
-    if code != 0:
-        log_error("Capacitor 同步失败")
-        return False
-    log_success("Capacitor 同步成功")
+    return True
 
-    # sync 后再次应用，防止 Android 项目中文件被默认值回写
-    apply_android_app_metadata(config)
-    
-    # 配置 Android 权限
-    configure_android_permissions()
+
+def prepare_www(config):
+    """生成 android_build/www；输入未变化时直接从共享产物缓存恢复（含音频清单、播放清单、图标）"""
+    # 统一只使用 www 作为 Web 资源根目录，清理历史重复文件
+    cleanup_legacy_root_assets()
+    cache = open_artifact_cache(config["artifact_cache"])
+    www_key = compute_www_stage_key(config) if cache else None
+    return run_cached_stage(cache, "www", www_key, WWW_DIR, copy_web_assets)
+
+
+def sync_stages(config):
+    """sync 的阶段图：课程校验 -> www -> capacitor.config.ts -> cap sync，再渲染 Android 工程"""
+    def write_config():
+        # cap sync 读取 capacitor.config.ts，需先写入；状态栏颜色取自 www/index.html，需在 www 之后
+        write_capacitor_config(config)
+        return True
+
+    return [
+        # 先校验课程数据（按文件摘要缓存，未变化时几乎零开销）
+        BuildStage("lint", func=lint),
+        BuildStage("www", func=lambda: prepare_www(config), deps=("lint",)),
+        BuildStage("capacitor_config", func=write_config, deps=("www",)),
+        BuildStage("cap_sync", cmd=["npx.cmd", "cap", "sync"], cwd=ANDROID_BUILD_DIR,
+                   deps=("www", "capacitor_config"), timeout=STAGE_TIMEOUTS["cap_sync"]),
+        # sync 后一次性渲染 Android 工程（元数据、权限、图标），只写入有变化的文件
+        BuildStage("render_android", func=lambda: apply_android_app_metadata(config), deps=("cap_sync",)),
+    ]
+
+
+# 同步功能
+def sync():
+    """同步 Web 代码到 Android 项目"""
+    log_step("同步 Web 代码到 Android 项目")
+    config = read_args_yaml()
+    if not run_stages(sync_stages(config)):
+        log_error("代码同步失败")
+        return False
     
     log_success("代码同步完成")
     return True
 
-# 配置 Android 权限
-def configure_android_permissions():
-    """配置 Android 应用权限"""
-    if not os.path.exists(ANDROID_DIR):
-        return
-    
-    manifest_path = os.path.join(ANDROID_DIR, "app", "src", "main", "AndroidManifest.xml")
-    if not os.path.exists(manifest_path):
-        log_error("AndroidManifest.xml 不存在")
-        return
-    
-    try:
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 检查是否已添加权限
-        permissions = [
-            "<uses-permission android:name=\"android.permission.INTERNET\" />",
-            "<uses-permission android:name=\"android.permission.READ_EXTERNAL_STORAGE\" />",
-            "<uses-permission android:name=\"android.permission.WRITE_EXTERNAL_STORAGE\" />",
-            "<uses-permission android:name=\"android.permission.RECORD_AUDIO\" />",
-            "<uses-permission android:name=\"android.permission.MODIFY_AUDIO_SETTINGS\" />",
-            "<uses-permission android:name=\"android.permission.MANAGE_EXTERNAL_STORAGE\" />",
-            "<uses-permission android:name=\"android.permission.ACCESS_NETWORK_STATE\" />",
-            "<uses-permission android:name=\"android.permission.ACCESS_WIFI_STATE\" />",
-        ]
-        
-        # 在 </manifest> 前添加权限
-        for permission in permissions:
-            if permission not in content:
-                content = content.replace('</manifest>', f'    {permission}\n</manifest>')
-        
-        with open(manifest_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        log_success("Android 权限配置成功")
-    except Exception as e:
-        log_error(f"配置 Android 权限失败: {e}")
-
 # 构建功能
 def build():
-    """构建 APK 并复制到项目根目录"""
+    """构建 APK 并复制到项目根目录
+
+    在 sync 阶段图之上追加：Gradle 守护进程预热（与 sync 并行）、APK 缓存查询、assembleDebug、复制产物。
+    """
     config = read_args_yaml()
 
-    # 先同步代码
-    if not sync():
-        return False
-    
     log_step("构建 APK")
     
     if not os.path.exists(GRADLE_WRAPPER):
         log_error("Gradle 包装器不存在，请先执行 init 命令")
         return False
-    
-    # 执行 Gradle 构建
-    log_info("执行 Gradle 构建...")
+
     # 使用绝对路径
     gradlew_cmd = os.path.abspath(GRADLE_WRAPPER)
     log_info(f"使用 Gradle 命令: {gradlew_cmd}")
-    code, stdout, stderr = run_command([gradlew_cmd, "assembleDebug"], cwd=ANDROID_DIR)
-    if code != 0:
-        log_error("Gradle 构建失败")
+
+    # sync 后的工程与缓存条目一致时直接恢复 APK 输出目录，跳过 Gradle
+    cache = open_artifact_cache(config["artifact_cache"])
+    apk = {"key": None, "hit": False}
+
+    def restore_apk():
+        if cache is not None:
+            apk["key"] = compute_apk_stage_key(config)
+            apk["hit"] = cache.restore("apk", apk["key"], APK_OUTPUT_DIR)
+            if apk["hit"]:
+                log_success(f"命中产物缓存: apk ({apk['key'][:12]})")
+        return True
+
+    def store_apk():
+        store_stage_artifact(cache, "apk", apk["key"], APK_OUTPUT_DIR)
+        return True
+
+    stages = sync_stages(config) + [
+        # 预热 Gradle 守护进程；失败不影响构建，APK 命中缓存时会被取消
+        BuildStage("gradle_warmup", cmd=[gradlew_cmd, "help", "--daemon", "-q"], cwd=ANDROID_DIR,
+                   timeout=STAGE_TIMEOUTS["gradle_warmup"], optional=True),
+        BuildStage("apk_cache", func=restore_apk, deps=("render_android",)),
+        BuildStage("gradle_assemble", cmd=[gradlew_cmd, "assembleDebug"], cwd=ANDROID_DIR,
+                   deps=("apk_cache",), after=("gradle_warmup",), timeout=STAGE_TIMEOUTS["gradle_assemble"],
+                   enabled=lambda: not apk["hit"]),
+        BuildStage("apk_store", func=store_apk, deps=("gradle_assemble",),
+                   enabled=lambda: cache is not None and not apk["hit"]),
+        BuildStage("copy_apk", func=lambda: copy_apk_to_output(config), deps=("apk_store",)),
+    ]
+    if not run_stages(stages):
+        log_error("构建失败")
         return False
-    log_success("Gradle 构建成功")
-    
+
+    log_success("构建完成")
+    return True
+
+
+def copy_apk_to_output(config):
+    """把 APK 按版本命名复制到输出目录，并清理可再生的构建产物"""
     # 查找 APK 文件
-    apk_pattern = os.path.join(ANDROID_DIR, "app", "build", "outputs", "apk", "debug", "*.apk")
-    apk_files = list(Path(ANDROID_DIR).glob("app/build/outputs/apk/debug/*.apk"))
+    apk_files = list(Path(APK_OUTPUT_DIR).glob("*.apk"))
     
     if not apk_files:
         log_error("未找到生成的 APK 文件")
@@ -895,8 +2632,6 @@ def build():
 
     # 构建完成后清理 android_build 下可再生产物，避免目录膨胀
     cleanup_post_build_artifacts()
-    
-    log_success("构建完成")
     return True
 
 # 清理功能
@@ -940,13 +2675,268 @@ def clean():
     log_success("清理完成")
     return True
 
+# 拉取内置音频
+def pull_audio(base_url=None, prefix="", workers=AUDIO_PULL_WORKERS):
+    """从 Supabase 存储桶镜像音频到 shizi-audio-cache（并发、可续传、带校验）"""
+    import hashlib
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    log_step("拉取内置音频")
+
+    supabase_config = read_supabase_config()
+    base_url = base_url or supabase_config["url"]
+    if not base_url:
+        log_error(f"未配置存储地址，请检查 {SUPABASE_CONFIG_JS} 或使用 --base-url")
+        return False
+
+    try:
+        client = StorageClient(base_url, supabase_config["key"], supabase_config["bucket"])
+        log_info(f"列出存储桶 {supabase_config['bucket']}: {base_url} (prefix={prefix or '/'})")
+        remote_files = client.list_objects(prefix)
+    except Exception as e:
+        log_error(f"列出存储桶失败: {e}")
+        return False
+    log_info(f"远端共 {len(remote_files)} 个文件，并发数 {workers}")
+
+    previous_manifest = load_json_file(AUDIO_PULL_MANIFEST, {}) or {}
+    previous_entries = {item["path"]: item for item in previous_manifest.get("files", [])}
+
+    counts = {"skipped": 0, "downloaded": 0, "resumed": 0, "removed": 0, "failed": 0}
+    entries = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(pull_audio_file, client, remote, BUILTIN_AUDIO_SRC_DIR, previous_entries.get(remote["path"])): remote
+            for remote in remote_files
+        }
+        for future in as_completed(futures):
+            remote = futures[future]
+            try:
+                status, entry = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                log_warning(f"下载失败: {remote['path']}, {e}")
+                continue
+            counts[status] += 1
+            entries[entry["path"]] = entry
+            if status != "skipped":
+                log_info(f"{status}: {remote['path']} ({entry['size']} bytes)")
+
+    # 远端已删除的音频从本地镜像中移除，否则仍会被打包进 www/audio 与音频清单；
+    # 远端列表为空时（prefix 写错、存储桶为空）不清理，避免误删整个镜像
+    remote_paths = {remote["path"] for remote in remote_files}
+    if remote_paths:
+        removed = prune_local_audio(BUILTIN_AUDIO_SRC_DIR, prefix, remote_paths)
+        counts["removed"] = len(removed)
+        for rel in removed:
+            log_info(f"removed: {rel}")
+    else:
+        log_warning("远端列表为空，跳过本地清理")
+
+    # 仅限定 prefix 时保留其余路径的旧记录，保证清单覆盖整个本地目录
+    for path, entry in previous_entries.items():
+        if prefix and not path.startswith(prefix) and path not in entries:
+            entries[path] = entry
+
+    files = [entries[path] for path in sorted(entries)]
+    digest = hashlib.sha256()
+    for entry in files:
+        digest.update(entry["path"].encode("utf-8"))
+        digest.update(entry["sha256"].encode("utf-8"))
+    write_json_atomic(AUDIO_PULL_MANIFEST, {
+        "version": digest.hexdigest()[:16],
+        "source": f"{base_url.rstrip('/')}/{supabase_config['bucket']}",
+        "count": len(files),
+        "files": files,
+    })
+    log_success(f"写入拉取清单: {AUDIO_PULL_MANIFEST} (共 {len(files)} 个文件)")
+
+    summary = (f"新下载 {counts['downloaded']}，续传 {counts['resumed']}，"
+               f"跳过 {counts['skipped']}，删除 {counts['removed']}，失败 {counts['failed']}")
+    if counts["failed"]:
+        log_error(f"内置音频拉取未全部完成: {summary}")
+        return False
+    log_success(f"内置音频拉取完成: {summary}")
+    return True
+
+# audio_records 快照
+def load_records_export(path):
+    """读取 audio_records 导出文件：JSON 数组（或 {"records": [...]}）及控制台导出的 CSV"""
+    if path.lower().endswith(".csv"):
+        import csv
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return list(csv.DictReader(f))
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("records")
+    if not isinstance(data, list):
+        raise ValueError(f"无法识别的导出格式: {path}")
+    return data
+
+
+def build_records_snapshot(records):
+    """生成紧凑快照：列名只写一次，rows 按 path 排序
+
+    size/sha256 取自本地 shizi-audio-cache 镜像（不存在时为 null），sha256 只保留前 16 位；
+    version 为内容摘要，watermark 为最大 created_at，应用据此只查询更新的记录；
+    generated_at 为生成时间（UTC），应用据此判断快照是否过期。
+    """
+    import hashlib
+    from datetime import datetime, timezone
+    local = source_audio_digests(BUILTIN_AUDIO_SRC_DIR) if os.path.isdir(BUILTIN_AUDIO_SRC_DIR) else {}
+    by_path = {}
+    for record in records:
+        path = str(record.get("path") or "").strip()
+        if path:
+            by_path[path] = record
+
+    rows = []
+    watermark = ""
+    for path in sorted(by_path):
+        record = by_path[path]
+        created_at = str(record.get("created_at") or "")
+        info = local.get(path) or {}
+        sha256_hex = info.get("sha256")
+        rows.append([
+            path,
+            str(record.get("level") or ""),
+            str(record.get("unit") or ""),
+            str(record.get("char") or ""),
+            str(record.get("type") or ""),
+            info.get("size"),
+            sha256_hex[:16] if sha256_hex else None,
+            created_at,
+        ])
+        watermark = max(watermark, created_at)
+
+    version = hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    return {
+        "version": version,
+        "watermark": watermark,
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "count": len(rows),
+        "columns": ["path", "level", "unit", "char", "type", "size", "sha256", "created_at"],
+        "rows": rows,
+    }
+
+
+def snapshot_records(base_url=None, export_path=None):
+    """从导出文件或 Supabase（可为本地替身服务）生成 audio_records 快照"""
+    log_step("生成 audio_records 快照")
+    try:
+        if export_path:
+            log_info(f"读取导出文件: {export_path}")
+            records = load_records_export(export_path)
+        else:
+            supabase_config = read_supabase_config()
+            base_url = base_url or supabase_config["url"]
+            if not base_url:
+                log_error(f"未配置数据库地址，请检查 {SUPABASE_CONFIG_JS}、使用 --base-url 或 --from-export")
+                return False
+            client = StorageClient(base_url, supabase_config["key"], supabase_config["bucket"])
+            log_info(f"读取 audio_records: {base_url}")
+            records = client.select_rows("audio_records", AUDIO_RECORDS_COLUMNS, "created_at.asc,path.asc")
+    except Exception as e:
+        log_error(f"读取 audio_records 失败: {e}")
+        return False
+
+    snapshot = build_records_snapshot(records)
+    write_json_atomic(AUDIO_RECORDS_SNAPSHOT, snapshot, indent=None)
+    log_success(
+        f"写入 audio_records 快照: {AUDIO_RECORDS_SNAPSHOT} "
+        f"(共 {snapshot['count']} 条，版本 {snapshot['version']}，截至 {snapshot['watermark'] or '-'})"
+    )
+    return True
+
 # 主函数
+def sample_folded_stacks(stop_event, counts):
+    """定时采样各线程调用栈（阶段函数在线程池中执行），按 "a;b;c" 折叠计数，供火焰图工具使用"""
+    import threading
+    sampler_id = threading.get_ident()
+    while not stop_event.wait(PROFILE_SAMPLE_INTERVAL):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == sampler_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+
+
+def run_profiled(name, func):
+    """用 cProfile + tracemalloc 运行命令，结果写入 .build_cache/profile/
+
+    <命令>-<时间>.prof    pstats 原始数据，可用 snakeviz 等工具查看
+    <命令>-<时间>.txt     按累计耗时排序的函数统计与内存分配热点
+    <命令>-<时间>.folded  折叠调用栈，可直接交给 flamegraph.pl / speedscope
+
+    只统计 build.py 自身进程，gradle、npx 等子进程不在其中；cProfile 只记录主线程，
+    在线程池中执行的阶段函数请看 .folded。
+    """
+    import cProfile
+    import io
+    import pstats
+    import threading
+    import time
+    import tracemalloc
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+    counts = {}
+    stop_event = threading.Event()
+    sampler = threading.Thread(
+        target=sample_folded_stacks,
+        args=(stop_event, counts),
+        daemon=True,
+    )
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    sampler.start()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        stop_event.set()
+        sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(f"{base}.prof")
+        report = io.StringIO()
+        report.write(f"命令: {name}\n耗时: {elapsed:.3f}s\n内存峰值: {peak / 1024 / 1024:.2f} MiB\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        report.write("内存分配热点（按行）:\n")
+        for stat in snapshot.statistics("lineno")[:PROFILE_TOP_N]:
+            report.write(f"  {stat}\n")
+        write_file(f"{base}.txt", report.getvalue())
+        write_file(
+            f"{base}.folded",
+            "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items())),
+        )
+        log_info(f"性能分析: 耗时 {elapsed:.3f}s，内存峰值 {peak / 1024 / 1024:.2f} MiB")
+        log_info(f"分析结果: {base}.txt / .prof / .folded")
+
+
 def main():
     parser = argparse.ArgumentParser(description='Android APK 构建脚本')
-    parser.add_argument('command', choices=['init', 'sync', 'build', 'clean'], help='执行的命令')
+    parser.add_argument('command', choices=['init', 'sync', 'build', 'clean', 'pull-audio', 'process-audio', 'lint', 'render-android', 'snapshot-records'], help='执行的命令')
+    parser.add_argument('--base-url', default=None, help='pull-audio/snapshot-records: 覆盖 Supabase 地址（可指向本地替身服务）')
+    parser.add_argument('--from-export', default=None, help='snapshot-records: 从 audio_records 导出文件（JSON/CSV）生成快照')
+    parser.add_argument('--prefix', default='', help='pull-audio: 只拉取指定前缀，如 L1/')
+    parser.add_argument('--workers', type=int, default=AUDIO_PULL_WORKERS, help='pull-audio: 并发连接数')
+    parser.add_argument('--dry-run', action='store_true', help='render-android: 只输出差异，不写入文件')
+    parser.add_argument('--profile', action='store_true', help='用 cProfile/tracemalloc 分析本次命令，结果写入 .build_cache/profile/')
     args = parser.parse_args()
-    
-    try:
+
+    def dispatch():
         if args.command == 'init':
             init()
         elif args.command == 'sync':
@@ -955,6 +2945,28 @@ def main():
             build()
         elif args.command == 'clean':
             clean()
+        elif args.command == 'pull-audio':
+            if not pull_audio(args.base_url, args.prefix, args.workers):
+                sys.exit(1)
+        elif args.command == 'render-android':
+            log_step("渲染 Android 工程")
+            apply_android_app_metadata(read_args_yaml(), dry_run=args.dry_run)
+        elif args.command == 'lint':
+            if not lint():
+                sys.exit(1)
+        elif args.command == 'process-audio':
+            log_step("处理内置音频")
+            if not process_builtin_audio(read_args_yaml()["audio_processing"]):
+                sys.exit(1)
+        elif args.command == 'snapshot-records':
+            if not snapshot_records(args.base_url, args.from_export):
+                sys.exit(1)
+
+    try:
+        if args.profile:
+            run_profiled(args.command, dispatch)
+        else:
+            dispatch()
     except KeyboardInterrupt:
         log_error("用户中断操作")
         sys.exit(1)
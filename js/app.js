@@ -391,6 +391,7 @@ function stopLearnBatchPlayback(resetQueue = true) {
   learnBatchPlayback.running = false;
   learnBatchPlayback.paused = false;
   audioManager.stopCurrentAudio();
+  audioManager.clearPrefetched();
   clearLearnBatchHighlight();
 
   if (learnBatchPlayback.button) {
@@ -431,7 +432,15 @@ async function runLearnBatchPlaybackLoop(token) {
         item.index,
         finish,
       ).then((success) => {
-        if (!success) finish();
+        if (!success) {
+          finish();
+          return;
+        }
+        // 当前片段开始播放后预取后续片段，使下一项可紧接着开始
+        const upcoming = learnBatchPlayback.sequence
+          .slice(learnBatchPlayback.index + 1)
+          .map(next => [next.level, next.unit, next.rootChar, next.text, next.type, next.index]);
+        audioManager.prefetchUpcoming(upcoming).catch(err => console.warn('预取音频失败:', err));
       }).catch(() => {
         finish();
       });
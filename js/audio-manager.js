@@ -1,4 +1,19 @@
 // 音频管理器：录音、上传、播放音频（使用 Supabase）
+
+// 连续播放的预取窗口：最多预取的片段数、累计时长（秒）与字节数
+const PREFETCH_MAX_CLIPS = 4;
+const PREFETCH_MAX_SECONDS = 12;
+const PREFETCH_MAX_BYTES = 1.5 * 1024 * 1024;
+// 已知时长时，超过 时长 + 该余量 仍未收到 ended 则视为播放结束
+const END_WATCHDOG_GRACE_MS = 1500;
+// 构建时生成的 audio_records 快照（build.py snapshot-records），应用只增量查询其后的新记录
+const AUDIO_RECORDS_SNAPSHOT_URL = 'audio-records.json';
+const AUDIO_RECORD_COLUMNS = 'path,level,unit,char,type,created_at';
+// 快照超过该时长（或缺少 generated_at）视为过期，改为全表查询
+const AUDIO_RECORDS_SNAPSHOT_MAX_AGE_MS = 30 * 24 * 60 * 60 * 1000;
+// PostgREST 单次返回行数上限，全表查询按此分页
+const AUDIO_RECORDS_PAGE_SIZE = 1000;
+
 class AudioManager {
   constructor() {
     this.supabase = null;
@@ -7,6 +22,12 @@ class AudioManager {
     this.isRecording = false;
     this.currentAudio = null;
     this.builtInAudioMap = new Map();
+    this.builtInManifestReady = Promise.resolve(null);
+    this.builtInShardLoads = new Map();
+    this.unitPlaylists = new Map();
+    this.prefetchedAudio = new Map();
+    this.endWatchdog = null;
+    this.recordsSnapshot = null;
   }
 
   init() {
@@ -211,40 +232,124 @@ class AudioManager {
     }
   }
 
+  // 读取随应用打包的 audio_records 快照（只加载一次）；不存在时（如网页版）返回 null
+  loadRecordsSnapshot() {
+    if (!this.recordsSnapshot) {
+      this.recordsSnapshot = (async () => {
+        try {
+          const res = await fetch(`${AUDIO_RECORDS_SNAPSHOT_URL}${this.cacheSuffix || ''}`, { cache: 'no-store' });
+          if (!res.ok) return null;
+          const snapshot = await res.json();
+          const generatedAt = Date.parse(snapshot.generated_at || '');
+          if (!(Date.now() - generatedAt <= AUDIO_RECORDS_SNAPSHOT_MAX_AGE_MS)) {
+            console.info('audio_records 快照已过期，改为全表查询:', snapshot.generated_at || '未知');
+            return null;
+          }
+          const columns = snapshot.columns || [];
+          const records = (snapshot.rows || []).map(row => {
+            const record = {};
+            columns.forEach((column, i) => { record[column] = row[i]; });
+            return record;
+          });
+          return { watermark: snapshot.watermark || '', records };
+        } catch (e) {
+          console.warn('读取 audio_records 快照失败:', e);
+          return null;
+        }
+      })();
+    }
+    return this.recordsSnapshot;
+  }
+
+  // 分页读取全表（只取所需列），失败时返回 null
+  async fetchAllAudioRecords() {
+    const records = [];
+    for (let from = 0; ; from += AUDIO_RECORDS_PAGE_SIZE) {
+      const { data, error } = await this.supabase
+        .from('audio_records')
+        .select(AUDIO_RECORD_COLUMNS)
+        .order('path')
+        .range(from, from + AUDIO_RECORDS_PAGE_SIZE - 1);
+      if (error) {
+        console.error('获取音频记录失败:', error);
+        return null;
+      }
+      records.push(...data);
+      if (data.length < AUDIO_RECORDS_PAGE_SIZE) return records;
+    }
+  }
+
+  // 快照 + 增量查询：只拉取 created_at 晚于快照的记录，按 path 合并（新记录覆盖快照）。
+  // 增量查询看不到快照之后被删除的记录，同时取服务器精确行数校验，不一致时改为全表查询
   async getAllAudioRecords() {
     this.init();
-    const { data, error } = await this.supabase
+    const snapshot = await this.loadRecordsSnapshot();
+    if (!this.supabase) return snapshot ? snapshot.records : [];
+    if (!snapshot) return (await this.fetchAllAudioRecords()) || [];
+
+    let query = this.supabase
       .from('audio_records')
-      .select('*');
+      .select(AUDIO_RECORD_COLUMNS);
+    if (snapshot.watermark) {
+      query = query.gt('created_at', snapshot.watermark);
+    }
+    const [{ data, error }, { count, error: countError }] = await Promise.all([
+      query,
+      this.supabase.from('audio_records').select('path', { count: 'exact', head: true }),
+    ]);
     if (error) {
       console.error('获取音频记录失败:', error);
-      return [];
+      return snapshot.records;
     }
-    return data;
+
+    const merged = new Map(snapshot.records.map(record => [record.path, record]));
+    data.forEach(record => merged.set(record.path, { ...merged.get(record.path), ...record }));
+    if (!countError && typeof count === 'number' && count !== merged.size) {
+      console.info(`audio_records 快照已失效（服务器 ${count} 条，快照合并后 ${merged.size} 条），改为全表查询`);
+      const records = await this.fetchAllAudioRecords();
+      if (records) return records;
+    }
+    return Array.from(merged.values());
   }
 
+  // 有快照时用“快照 + 增量”在本地统计；没有快照（网页版或未执行 snapshot-records）时
+  // 用精确计数与最新一条查询，避免整表下载（且受 PostgREST 单次 1000 行上限影响）
   async getAudioStats() {
     this.init();
-    const { count, error } = await this.supabase
-      .from('audio_records')
-      .select('*', { count: 'exact', head: false })
-      .eq('type', 'char')
-      .limit(1);
+    const snapshot = await this.loadRecordsSnapshot();
+    if (!snapshot && this.supabase) {
+      const { count, error } = await this.supabase
+        .from('audio_records')
+        .select('path', { count: 'exact', head: true })
+        .eq('type', 'char');
+      if (error) {
+        console.error('统计音频数量失败:', error);
+      }
 
-    if (error) {
-      console.error('统计音频数量失败:', error);
+      const { data: latest } = await this.supabase
+        .from('audio_records')
+        .select('*')
+        .order('created_at', { ascending: false })
+        .limit(1)
+        .maybeSingle();
+
+      return {
+        charCount: count || 0,
+        latest: latest
+      };
     }
 
-    const { data: latest, error: latestError } = await this.supabase
-      .from('audio_records')
-      .select('*')
-      .order('created_at', { ascending: false })
-      .limit(1)
-      .maybeSingle();
+    const records = await this.getAllAudioRecords();
+    let charCount = 0;
+    let latest = null;
+    records.forEach(record => {
+      if (record.type === 'char') charCount++;
+      if (!latest || (record.created_at || '') > (latest.created_at || '')) latest = record;
+    });
 
     return {
-      charCount: count || 0,
-      latest: latest
+      charCount,
+      latest
     };
   }
 
@@ -258,47 +363,111 @@ class AudioManager {
     return data.publicUrl;
   }
 
-  async warmBuiltInAudioCache() {
+  // 把内置音频相对路径登记为“远端 URL -> 本地 asset URL”映射
+  mapBuiltInFiles(files) {
+    for (const item of files) {
+      const relativePath = item.path;
+      const { data } = this.supabase
+        .storage
+        .from(SUPABASE_CONFIG.bucket)
+        .getPublicUrl(relativePath);
+      this.builtInAudioMap.set(data.publicUrl, `audio/${relativePath}${this.cacheSuffix || ''}`);
+    }
+    return files.length;
+  }
+
+  // 加载单个清单分片并登记映射，同一分片只请求一次
+  loadBuiltInShard(shard) {
+    if (!this.builtInShardLoads.has(shard.path)) {
+      const url = `${shard.path}${this.cacheSuffix || ''}`;
+      this.builtInShardLoads.set(shard.path, fetch(url)
+        .then(res => (res.ok ? res.json() : null))
+        .then(data => (data && Array.isArray(data.files) ? this.mapBuiltInFiles(data.files) : 0))
+        .catch((e) => {
+          console.warn('读取内置音频清单分片失败:', shard.path, e);
+          return 0;
+        }));
+    }
+    return this.builtInShardLoads.get(shard.path);
+  }
+
+  // 播放/预取前确保该单元的分片已加载；清单未就绪或无此分片时直接返回
+  async ensureBuiltInShard(level, unit) {
+    const shards = await this.builtInManifestReady;
+    if (!shards) return;
+    const shard = shards.get(`${encodeURIComponent(level)}/Unit_${this.getUnitCode(unit)}`);
+    if (shard) await this.loadBuiltInShard(shard);
+  }
+
+  // 空闲时逐个加载剩余分片，每次回调只处理一个，避免与首屏渲染争抢主线程
+  scheduleBuiltInShards(queue) {
+    const idle = window.requestIdleCallback
+      ? (cb) => window.requestIdleCallback(cb, { timeout: 2000 })
+      : (cb) => setTimeout(cb, 50);
+    const next = () => {
+      const shard = queue.shift();
+      if (!shard) return;
+      this.loadBuiltInShard(shard).then(() => idle(next));
+    };
+    idle(next);
+  }
+
+  // 启动预热：priority 为保存的位置 { level, unitName }，
+  // 先加载该单元的分片，再在空闲时按“同等级 -> 其他等级”的顺序加载其余分片
+  warmBuiltInAudioCache(priority = {}) {
     this.init();
-    if (!this.supabase) return;
+    if (!this.supabase) return Promise.resolve();
     this.builtInAudioMap.clear();
+    this.builtInShardLoads = new Map();
+    this.builtInManifestReady = this.loadBuiltInManifest();
+    return this.builtInManifestReady.then(async (shards) => {
+      if (!shards) return;
+      const level = priority.level ? encodeURIComponent(priority.level) : null;
+      const first = priority.unitName
+        ? shards.get(`${level}/Unit_${this.getUnitCode(priority.unitName)}`)
+        : null;
+      if (first) {
+        const mappedCount = await this.loadBuiltInShard(first);
+        console.log(`内置音频映射预热完成（当前单元）: ${first.path} ${mappedCount} 个文件`);
+      }
+      const rest = [...shards.values()].filter(shard => shard !== first);
+      rest.sort((a, b) => (b.level === level) - (a.level === level));
+      this.scheduleBuiltInShards(rest);
+    });
+  }
 
+  // 读取根清单，返回 "等级/单元" -> 分片 的 Map；旧版整表清单直接全部登记并返回 null
+  async loadBuiltInManifest() {
     const manifestUrl = `audio-manifest.json${this.cacheSuffix || ''}`;
     let manifest = null;
     try {
       const res = await fetch(manifestUrl, { cache: 'no-store' });
-      if (!res.ok) return;
+      if (!res.ok) return null;
       manifest = await res.json();
     } catch (e) {
       console.warn('读取内置音频清单失败:', e);
-      return;
+      return null;
     }
+    if (!manifest) return null;
 
-    if (!manifest || !Array.isArray(manifest.files) || manifest.files.length === 0) {
-      return;
-    }
-
-    let mappedCount = 0;
-    for (const item of manifest.files) {
-      const relativePath = item.path;
-      const { data } = this.supabase
-        .storage
-        .from(SUPABASE_CONFIG.bucket)
-        .getPublicUrl(relativePath);
-      const remoteUrl = data.publicUrl;
+    const version = manifest.version || 'v0';
+    localStorage.setItem('shizi_builtin_audio_manifest_version', version);
 
-      const localUrl = `audio/${relativePath}${this.cacheSuffix || ''}`;
-      this.builtInAudioMap.set(remoteUrl, localUrl);
-      mappedCount++;
+    if (Array.isArray(manifest.files)) {
+      const mappedCount = this.mapBuiltInFiles(manifest.files);
+      console.log(`内置音频映射预热完成: ${mappedCount}/${manifest.files.length}`);
+      return null;
     }
+    if (!Array.isArray(manifest.shards) || manifest.shards.length === 0) return null;
 
-    const version = manifest.version || 'v0';
-    localStorage.setItem('shizi_builtin_audio_manifest_version', version);
-    console.log(`内置音频映射预热完成: ${mappedCount}/${manifest.files.length}`);
+    const shards = new Map();
+    manifest.shards.forEach(shard => shards.set(`${shard.level}/${shard.unit}`, shard));
+    return shards;
   }
 
   // 停止当前音频播放并触发回调
   stopCurrentAudio() {
+    this.clearEndWatchdog();
     if (this.currentAudio) {
       this.currentAudio.pause();
       this.currentAudio = null;
@@ -309,23 +478,29 @@ class AudioManager {
     }
   }
 
-  async playAudio(level, unit, char, text, type, index, onStopCallback) {
-    this.init();
-    const filePath = this.getFilePath(level, unit, char, text, type, index);
-    const { data } = this.supabase
-      .storage
-      .from(SUPABASE_CONFIG.bucket)
-      .getPublicUrl(filePath);
+  // 读取构建期生成的单元播放清单（片段时长与字节数），不存在时返回 null
+  getUnitPlaylist(level, unit) {
+    const key = `${level}/Unit_${this.getUnitCode(unit)}`;
+    if (!this.unitPlaylists.has(key)) {
+      const url = `playlists/${encodeURIComponent(level)}/${encodeURIComponent(`Unit_${this.getUnitCode(unit)}`)}.json${this.cacheSuffix || ''}`;
+      this.unitPlaylists.set(key, fetch(url)
+        .then(res => (res.ok ? res.json() : null))
+        .catch(() => null));
+    }
+    return this.unitPlaylists.get(key);
+  }
 
-    const baseUrl = data.publicUrl;
-    // 添加时间戳绕过 CDN 缓存
-    const url = `${baseUrl}${baseUrl.includes('?') ? '&' : '?'}t=${Date.now()}`;
-    let playUrl = url;
+  // 获取单个片段的 { duration, size }，未知时返回 null
+  async getClipInfo(level, unit, char, text, type, index) {
+    const playlist = await this.getUnitPlaylist(level, unit);
+    if (!playlist || !playlist.clips) return null;
+    return playlist.clips[this.getFilePath(level, unit, char, text, type, index)] || null;
+  }
 
-    // 停止当前播放并触发回调
-    this.stopCurrentAudio();
+  // 按优先级解析可播放地址：Cache API -> 内置音频 -> 网络下载（写入缓存）-> 远端地址
+  async resolvePlayUrl(baseUrl, url) {
+    let playUrl = url;
 
-    // 从缓存读取或从服务器获取
     if ('caches' in window) {
       try {
         const cache = await caches.open('shizi-audio-cache');
@@ -366,18 +541,126 @@ class AudioManager {
       }
     }
 
+    return playUrl;
+  }
+
+  // 释放预取项：停止缓冲并回收 blob URL（正在播放的元素除外）
+  releasePrefetched(entryPromise) {
+    entryPromise.then((entry) => {
+      if (entry.audio === this.currentAudio) return;
+      entry.audio.removeAttribute('src');
+      entry.audio.load();
+      if (entry.url.startsWith('blob:') && entry.url !== this.currentAudioUrl) {
+        URL.revokeObjectURL(entry.url);
+      }
+    }).catch(() => {});
+  }
+
+  // 停止连续播放或切换单元时释放全部预取项
+  clearPrefetched() {
+    this.prefetchedAudio.forEach(entryPromise => this.releasePrefetched(entryPromise));
+    this.prefetchedAudio.clear();
+  }
+
+  // 预取单个片段：解析地址并创建 preload 的 Audio 元素，播放时直接复用
+  prefetchAudio(level, unit, char, text, type, index) {
+    this.init();
+    if (!this.supabase) return;
+
+    const baseUrl = this.getAudioUrl(level, unit, char, text, type, index);
+    if (this.prefetchedAudio.has(baseUrl)) return;
+
+    const url = `${baseUrl}${baseUrl.includes('?') ? '&' : '?'}t=${Date.now()}`;
+    const entryPromise = this.ensureBuiltInShard(level, unit)
+      .then(() => this.resolvePlayUrl(baseUrl, url))
+      .then((playUrl) => {
+        const audio = new Audio();
+        audio.preload = 'auto';
+        audio.src = playUrl;
+        audio.load();
+        return { audio, url: playUrl };
+      });
+    entryPromise.catch(() => this.prefetchedAudio.delete(baseUrl));
+    this.prefetchedAudio.set(baseUrl, entryPromise);
+
+    // 超出窗口时淘汰最早的预取
+    while (this.prefetchedAudio.size > PREFETCH_MAX_CLIPS * 2) {
+      const [oldestUrl, oldest] = this.prefetchedAudio.entries().next().value;
+      this.prefetchedAudio.delete(oldestUrl);
+      this.releasePrefetched(oldest);
+    }
+  }
+
+  // 预取即将播放的片段：clips 为 [level, unit, char, text, type, index] 参数列表，
+  // 按播放清单中的时长/字节数控制窗口；没有清单时只预取 1 个
+  async prefetchUpcoming(clips) {
+    let seconds = 0;
+    let bytes = 0;
+    for (let i = 0; i < clips.length && i < PREFETCH_MAX_CLIPS; i++) {
+      const info = await this.getClipInfo(...clips[i]);
+      this.prefetchAudio(...clips[i]);
+      if (!info || info.duration === null) break;
+      seconds += info.duration;
+      bytes += info.size;
+      if (seconds >= PREFETCH_MAX_SECONDS || bytes >= PREFETCH_MAX_BYTES) break;
+    }
+  }
+
+  clearEndWatchdog() {
+    if (this.endWatchdog) {
+      clearTimeout(this.endWatchdog);
+      this.endWatchdog = null;
+    }
+  }
+
+  async playAudio(level, unit, char, text, type, index, onStopCallback) {
+    this.init();
+    const filePath = this.getFilePath(level, unit, char, text, type, index);
+    const { data } = this.supabase
+      .storage
+      .from(SUPABASE_CONFIG.bucket)
+      .getPublicUrl(filePath);
+
+    const baseUrl = data.publicUrl;
+    // 添加时间戳绕过 CDN 缓存
+    const url = `${baseUrl}${baseUrl.includes('?') ? '&' : '?'}t=${Date.now()}`;
+
+    // 停止当前播放并触发回调
+    this.stopCurrentAudio();
+
+    // 优先使用已预取（已缓冲）的 Audio 元素，否则从缓存读取或从服务器获取
+    let audio = null;
+    let playUrl = url;
+    const prefetched = this.prefetchedAudio.get(baseUrl);
+    if (prefetched) {
+      this.prefetchedAudio.delete(baseUrl);
+      try {
+        ({ audio, url: playUrl } = await prefetched);
+      } catch (e) {
+        audio = null;
+      }
+    }
+    if (!audio) {
+      await this.ensureBuiltInShard(level, unit);
+      playUrl = await this.resolvePlayUrl(baseUrl, url);
+    }
+    const clipInfo = await this.getClipInfo(level, unit, char, text, type, index);
+
     // 播放
     try {
       // 释放之前的 blob URL 避免内存泄漏
-      if (this.currentAudioUrl && this.currentAudioUrl.startsWith('blob:')) {
+      if (this.currentAudioUrl && this.currentAudioUrl.startsWith('blob:') && this.currentAudioUrl !== playUrl) {
         URL.revokeObjectURL(this.currentAudioUrl);
       }
       this.currentAudioUrl = playUrl;
 
-      this.currentAudio = new Audio(playUrl);
+      this.currentAudio = audio || new Audio(playUrl);
       this.onStopCallback = onStopCallback;
+      const playingAudio = this.currentAudio;
 
-      this.currentAudio.onended = () => {
+      const finish = () => {
+        if (this.currentAudio !== playingAudio) return;
+        this.clearEndWatchdog();
         if (this.onStopCallback) {
           this.onStopCallback();
           this.onStopCallback = null;
@@ -385,16 +668,29 @@ class AudioManager {
         this.currentAudio = null;
       };
 
+      this.currentAudio.onended = finish;
+
       this.currentAudio.onerror = (e) => {
         console.warn('音频播放错误', e);
-        if (this.onStopCallback) {
-          this.onStopCallback();
-          this.onStopCallback = null;
-        }
-        this.currentAudio = null;
+        finish();
       };
 
       await this.currentAudio.play();
+
+      // 已知片段时长时设置兜底：部分 WebView 偶发不触发 ended，避免连续播放卡住。
+      // 优先用元素自身的时长；清单时长只对应内置音频，缓存中可能是更长的重新录制版本
+      // （MediaRecorder 录制的 WebM 时长常为 Infinity），此时不设兜底，只依赖 ended
+      if (this.currentAudio === playingAudio) {
+        let seconds = 0;
+        if (Number.isFinite(playingAudio.duration) && playingAudio.duration > 0) {
+          seconds = playingAudio.duration;
+        } else if (clipInfo && clipInfo.duration && playUrl.startsWith('audio/')) {
+          seconds = clipInfo.duration;
+        }
+        if (seconds) {
+          this.endWatchdog = setTimeout(finish, seconds * 1000 + END_WATCHDOG_GRACE_MS);
+        }
+      }
       return true;
     } catch (e) {
       console.warn('音频播放失败（可能不存在）:', e);
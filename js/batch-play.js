@@ -280,6 +280,7 @@ function stopCurrentAudio() {
     batchState.isPlaying = false;
     updatePlayButton();
   }
+  audioManager.clearPrefetched();
 }
 
 // 上一个项目
@@ -317,6 +318,21 @@ async function startQueuePlay() {
   await playQueueItem();
 }
 
+// 预取队列中当前项之后的片段，当前片段结束时下一项可立即开始
+function prefetchQueueAfter(queueIndex) {
+  const level = state.currentLevel;
+  const unit = state.unitKeys[state.currentUnitIndex];
+  const upcoming = batchState.items.slice(queueIndex + 1).map(item => [
+    level,
+    unit,
+    item.rootChar,
+    item.text,
+    item.type,
+    item.wordIndex !== undefined ? item.wordIndex : item.index,
+  ]);
+  audioManager.prefetchUpcoming(upcoming).catch(err => console.warn('预取音频失败:', err));
+}
+
 // 播放队列中的下一个项目
 async function playQueueItem() {
   if (!batchState.isQueuePlaying) return;
@@ -324,6 +340,7 @@ async function playQueueItem() {
   // 检查是否已播放完所有项目
   if (batchState.queueIndex >= batchState.items.length) {
     batchState.isQueuePlaying = false;
+    audioManager.clearPrefetched();
     updateQueuePlayButton();
     showToast('队列播放完成！', 'success');
     return;
@@ -341,8 +358,8 @@ async function playQueueItem() {
     const onStop = () => {
       batchState.completed.add(batchState.queueIndex);
       batchState.queueIndex++;
-      // 延迟100ms播放下一个
-      setTimeout(playQueueItem, 100);
+      // 下一项已预取，紧接着播放（异步调度，避免在回调中递归）
+      setTimeout(playQueueItem, 0);
     };
 
     const success = await audioManager.playAudio(
@@ -355,7 +372,9 @@ async function playQueueItem() {
       onStop
     );
 
-    if (!success) {
+    if (success) {
+      prefetchQueueAfter(batchState.queueIndex);
+    } else {
       showToast(`项目 ${item.text} 暂无录音，跳过`, 'info');
       batchState.queueIndex++;
       setTimeout(playQueueItem, 100);
@@ -397,6 +416,7 @@ async function nextUnit() {
 
 // 加载当前单元的批量播放数据
 function loadBatchUnit() {
+  audioManager.clearPrefetched();
   batchState.items = getBatchItems();
   batchState.currentIndex = 0;
   batchState.completed.clear();
@@ -451,9 +471,10 @@ export function exitBatchPlay() {
 
   // 如果正在播放，先停止
   if (batchState.isPlaying) {
-    audioManager.stopCurrentAudio().catch(err => showToast('停止播放失败: ' + (err?.message || err), 'error'));
+    audioManager.stopCurrentAudio();
     batchState.isPlaying = false;
   }
+  audioManager.clearPrefetched();
 
   if (batchState.isQueuePlaying) {
     batchState.isQueuePlaying = false;
@@ -20,14 +20,16 @@ setupBatchRecordEvents();
 setupBatchPlayEvents();
 
 (async () => {
-  // 启动时后台预热内置音频到 shizi-audio-cache，不阻塞页面初始化
+  const savedPos = loadSavedPosition();
+
+  // 启动时后台预热内置音频映射，优先加载上次所在单元的清单分片，不阻塞页面初始化
   if (window.audioManager && typeof window.audioManager.warmBuiltInAudioCache === 'function') {
-    window.audioManager.warmBuiltInAudioCache().catch((err) => {
+    const priority = savedPos ? { level: savedPos.level, unitName: savedPos.unitName } : {};
+    window.audioManager.warmBuiltInAudioCache(priority).catch((err) => {
       console.warn('内置音频预热失败:', err);
     });
   }
 
-  const savedPos = loadSavedPosition();
   if (savedPos) {
     if (savedPos.level) state.currentLevel = savedPos.level;
     // 恢复教学模式状态
@@ -1,5 +1,12 @@
 ﻿// UI 渲染：卡片、搜索结果、HTML 工具函数
-import { state } from './state.js';
+import { state, cacheSuffix } from './state.js';
+
+// 构建时预渲染的单元卡片（build.py 生成 units/<level>/index.json 与 uNNN.html）
+const unitFragmentIndexes = new Map();
+const unitFragmentRequests = new Map();
+const unitFragmentHtml = new Map();
+// 每次渲染递增；异步加载的片段只在仍是最新一次渲染时才写入页面
+let renderToken = 0;
 
 export function escapeHtml(str) {
   return String(str)
@@ -28,6 +35,65 @@ export function getBtnHtml(text, type, rootChar, level, unit, isSmall = false, i
   return `<button class="play-btn" title="${title}" style="${btnStyle}" data-text="${escapeHtml(text || '')}" data-type="${type}" data-root-char="${escapeHtml(rootChar || '')}" data-level="${escapeHtml(level || '')}" data-unit="${escapeHtml(unit || '')}" data-is-small="${isSmall}" data-index="${index !== null ? index : ''}">${icon}</button>`;
 }
 
+// 按当前模式填充按钮图标与提示（预渲染片段中的按钮只带数据属性）
+export function applyBtnMode(root) {
+  const iconId = state.isTeachingMode ? '#icon-mic' : '#icon-play';
+  const title = state.isTeachingMode ? '录音' : '播放';
+  root.querySelectorAll('.play-btn').forEach(btn => {
+    const svgAttr = btn.dataset.isSmall === 'true' ? ' style="width:16px;height:16px"' : '';
+    btn.innerHTML = `<svg${svgAttr}><use href="${iconId}"></use></svg>`;
+    btn.title = title;
+  });
+}
+
+function getFragmentKey(level, unitName) {
+  return `${level}\n${unitName}`;
+}
+
+function loadUnitFragmentIndex(level) {
+  if (!unitFragmentIndexes.has(level)) {
+    const url = `units/${encodeURIComponent(level)}/index.json${cacheSuffix}`;
+    unitFragmentIndexes.set(level, fetch(url)
+      .then(res => (res.ok ? res.json() : null))
+      .catch(() => null));
+  }
+  return unitFragmentIndexes.get(level);
+}
+
+// 加载单元片段；没有预渲染产物（如直接以网页方式运行）时返回 null
+function loadUnitFragment(level, unitName) {
+  const key = getFragmentKey(level, unitName);
+  if (!unitFragmentRequests.has(key)) {
+    unitFragmentRequests.set(key, loadUnitFragmentIndex(level)
+      .then(index => {
+        const file = index && index.units ? index.units[unitName] : null;
+        if (!file) return null;
+        return fetch(`units/${encodeURIComponent(level)}/${file}${cacheSuffix}`)
+          .then(res => (res.ok ? res.text() : null));
+      })
+      .catch(() => null)
+      .then(html => {
+        if (html) unitFragmentHtml.set(key, html);
+        return html;
+      }));
+  }
+  return unitFragmentRequests.get(key);
+}
+
+// 预取相邻单元，前后翻页时可同步替换
+function prefetchAdjacentFragments(level) {
+  [state.currentUnitIndex - 1, state.currentUnitIndex + 1].forEach(index => {
+    const unitName = state.unitKeys[index];
+    if (unitName !== undefined) loadUnitFragment(level, unitName);
+  });
+}
+
+function showUnitHtml(appEl, html) {
+  appEl.innerHTML = html;
+  applyBtnMode(appEl);
+  window.scrollTo(0, 0);
+}
+
 export function renderUnit() {
   const appEl = document.getElementById('app');
   const indicatorText = document.getElementById('indicatorText');
@@ -36,6 +102,7 @@ export function renderUnit() {
   const nextBtn = document.getElementById('nextUnit');
 
   if (!state.currentData || state.unitKeys.length === 0) {
+    renderToken++;
     appEl.innerHTML = '<div class="loading">暂无数据</div>';
     indicatorText.textContent = '0/0';
     return;
@@ -50,6 +117,27 @@ export function renderUnit() {
   prevBtn.disabled = state.currentUnitIndex === 0;
   nextBtn.disabled = state.currentUnitIndex === state.unitKeys.length - 1;
 
+  // 优先使用预渲染片段：已加载时同步替换，否则加载后替换，缺失时回退为按数据渲染
+  const token = ++renderToken;
+  const level = state.currentLevel;
+  const cachedHtml = unitFragmentHtml.get(getFragmentKey(level, unitName));
+  if (cachedHtml) {
+    showUnitHtml(appEl, cachedHtml);
+    prefetchAdjacentFragments(level);
+    return;
+  }
+  loadUnitFragment(level, unitName).then(html => {
+    if (token !== renderToken) return;
+    if (html) {
+      showUnitHtml(appEl, html);
+    } else {
+      renderUnitFromData(appEl, unitName, unitChars);
+    }
+    prefetchAdjacentFragments(level);
+  });
+}
+
+function renderUnitFromData(appEl, unitName, unitChars) {
   // 渲染卡片
   let html = `
     <div class="unit-title">
@@ -124,6 +212,8 @@ export function renderUnit() {
 }
 
 export function renderSearchResult(char, info, level, unit) {
+  // 丢弃尚未完成的单元片段渲染，避免覆盖搜索结果
+  renderToken++;
   const appEl = document.getElementById('app');
   const words = (info.词) ? info.词 : [];
   const sentence = (info.句) ? info.句 : '';
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""pull-audio 本地镜像清理：远端已删除的文件不应留在 shizi-audio-cache 与拉取清单中"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import build  # noqa: E402
+
+
+class FakeResponse(io.BytesIO):
+    status = 200
+
+
+class FakeStorageClient:
+    """替身存储：objects 为 {路径: 内容}，ETag 取内容 md5（与 Supabase 单段上传一致）"""
+
+    objects = {}
+
+    def __init__(self, base_url, key, bucket):
+        pass
+
+    def list_objects(self, prefix=""):
+        return [
+            {"path": path, "size": len(data), "etag": hashlib.md5(data).hexdigest()}
+            for path, data in sorted(self.objects.items())
+            if path.startswith(prefix)
+        ]
+
+    def open_object(self, path, headers=None):
+        return FakeResponse(self.objects[path])
+
+
+class PullAudioPruneTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp(prefix="shizi-pull-")
+        os.chdir(self.work_dir)
+        patcher = mock.patch.object(build, "StorageClient", FakeStorageClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def pull(self, objects, prefix=""):
+        FakeStorageClient.objects = objects
+        self.assertTrue(build.pull_audio(base_url="http://stand-in", prefix=prefix, workers=2))
+        with open(build.AUDIO_PULL_MANIFEST, "r", encoding="utf-8") as f:
+            return [item["path"] for item in json.load(f)["files"]]
+
+    def local_files(self):
+        return [rel for rel, _ in build.iter_sorted_files(build.BUILTIN_AUDIO_SRC_DIR)]
+
+    def test_removes_files_deleted_remotely(self):
+        self.pull({
+            "L1/Unit_1/kou/char.mp3": b"kou",
+            "L1/Unit_1/ren/char.mp3": b"ren",
+            "L2/Unit_1/da/char.mp3": b"da",
+        })
+        stale_part = os.path.join(build.BUILTIN_AUDIO_SRC_DIR, "L1", "Unit_1", "ren", "word_1.mp3.part")
+        with open(stale_part, "wb") as f:
+            f.write(b"partial")
+
+        paths = self.pull({
+            "L1/Unit_1/kou/char.mp3": b"kou",
+            "L2/Unit_1/da/char.mp3": b"da",
+        })
+
+        expected = ["L1/Unit_1/kou/char.mp3", "L2/Unit_1/da/char.mp3"]
+        self.assertEqual(paths, expected)
+        self.assertEqual(self.local_files(), expected)
+        self.assertFalse(os.path.exists(os.path.dirname(stale_part)))
+
+    def test_prefix_limits_pruning(self):
+        self.pull({
+            "L1/Unit_1/kou/char.mp3": b"kou",
+            "L2/Unit_1/da/char.mp3": b"da",
+        })
+
+        paths = self.pull({"L2/Unit_2/xiao/char.mp3": b"xiao"}, prefix="L2/")
+
+        expected = ["L1/Unit_1/kou/char.mp3", "L2/Unit_2/xiao/char.mp3"]
+        self.assertEqual(paths, expected)
+        self.assertEqual(self.local_files(), expected)
+
+    def test_empty_listing_keeps_local_files(self):
+        self.pull({"L1/Unit_1/kou/char.mp3": b"kou"})
+
+        FakeStorageClient.objects = {}
+        build.pull_audio(base_url="http://stand-in", workers=2)
+
+        self.assertEqual(self.local_files(), ["L1/Unit_1/kou/char.mp3"])
+
+
+if __name__ == "__main__":
+    unittest.main()